@@ -144,6 +144,8 @@ PLUGINS = [
     # Local plugins
     'i18n_init',  # Minimal i18n for theme (replaces pelican-i18n-subsites)
     'pelican_javascript',
+    'pelican_data',  # Shared YAML loading and build-once data for the plugins below
+    'pelican_bibliography',  # Shared BibTeX parsing for the plugins below
     'pelican-cite',
     #'pelican-bibtex',
     'pelican-selected-publications',
@@ -6,11 +6,15 @@ This replaces pelican-i18n-subsites which uses deprecated Jinja2 APIs.
 from pelican import signals
 import gettext
 
-def init_i18n(pelican_obj):
+# Null translations (English only, no actual translation), shared by the
+# Jinja2 environments of all generators
+null_translations = gettext.NullTranslations()
+
+
+def init_i18n(generator):
     """Initialize Jinja2 i18n extension with null translations."""
-    # Install null translations (English only, no actual translation)
-    null_translations = gettext.NullTranslations()
-    pelican_obj.env.install_gettext_translations(null_translations)
+    # Every generator has its own environment, so this runs for each
+    generator.env.install_gettext_translations(null_translations)
 
 def register():
     signals.generator_init.connect(init_i18n)
@@ -11,15 +11,194 @@ websites.
 # Author: Vlad Niculae <vlad@vene.ro>
 # Unlicense (see UNLICENSE for details)
 
+import hashlib
+import json
 import logging
+import os
 logger = logging.getLogger(__name__)
 
 from pelican import signals
 
 __version__ = '0.2.1'
 
+# Bump whenever the formatting of cached entries changes.
+CACHE_VERSION = 2
 
-def add_publications(generator):
+# Without pelican_data: the formatted entries, kept in memory between the
+# builds of one process, and the context the publications were last added to
+# (generator_init fires for every generator of a build).
+_memory_cache = {}
+_built_for = None
+
+# Shards waiting to be written once the build is finalized, as
+# (shard directory, shards); the output directory may be cleaned before then.
+_pending_shards = None
+
+
+def entry_hash(key, entry, mode):
+    """
+    Hash everything about an entry that affects its formatted text and
+    BibTeX, plus the formatting ``mode`` (shared service or local).
+    """
+    persons = [(role, [str(person) for person in people])
+               for role, people in entry.persons.items()]
+    state = (mode, key, entry.original_type, list(entry.fields.items()), persons)
+    return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()
+
+
+def cache_store(cache_path):
+    """
+    Return the ``pelican_data.PickleCache`` keeping the formatted entries in
+    ``cache_path`` between builds, or None when the site's ``pelican_data``
+    plugin is not enabled.
+    """
+    try:
+        import pelican_data
+    except ImportError:
+        return None
+    return pelican_data.PickleCache('`pelican_bibtex`', CACHE_VERSION, cache_path)
+
+
+def format_entries(refs_file, cache):
+    """
+    Parse ``refs_file`` and return ``(key, entry, text, bibtex)`` for each of
+    its entries, in the plain style's sort order.
+
+    ``cache`` maps entry hashes to ``(text, bibtex)``. Only entries missing
+    from it are formatted; afterwards it holds exactly the current entries.
+
+    Uses the site's shared ``pelican_bibliography`` service if it is enabled,
+    so that the file is parsed and formatted once for all plugins; otherwise
+    parses and formats it here. Raises ``PybtexError`` on parse errors.
+    """
+    try:
+        import pelican_bibliography
+    except ImportError:
+        pelican_bibliography = None
+
+    if pelican_bibliography is not None:
+        mode = 'service'
+        bib = pelican_bibliography.get(refs_file)
+        entries = bib.entries
+        keys = bib.sorted_keys()
+
+        def render(changed):
+            formatted = bib.format(changed)
+            return dict((key, tuple(formatted[key])) for key in changed)
+    else:
+        try:
+            from StringIO import StringIO
+        except ImportError:
+            from io import StringIO
+        from pybtex.database.input.bibtex import Parser
+        from pybtex.database.output.bibtex import Writer
+        from pybtex.database import BibliographyData
+        from pybtex.backends import html
+        from pybtex.style.formatting import plain
+
+        mode = 'local'
+        bibdata_all = Parser().parse_file(refs_file)
+        entries = bibdata_all.entries
+
+        # format entries
+        plain_style = plain.Style()
+        html_backend = html.Backend()
+        keys = [entry.key for entry in plain_style.sort(entries.values())]
+
+        def render(changed):
+            changed = [entries[key] for key in changed]
+
+            #hack added by Kyle Cranmer to avoid problems in bib with no journal entry
+            for entry in changed:
+                if 'journal' not in entry.fields:
+                    entry.fields['journal']=''
+                if 'booktitle' not in entry.fields:
+                    entry.fields['booktitle']=''
+
+            rendered = {}
+            writer = Writer()
+            for formatted_entry in plain_style.format_entries(changed):
+                key = formatted_entry.key
+                entry = entries[key]
+
+                #render the bibtex string for the entry
+                bib_buf = StringIO()
+                bibdata_this = BibliographyData(entries={key: entry})
+                writer.write_stream(bibdata_this, bib_buf)
+                text = formatted_entry.text.render(html_backend)
+                rendered[key] = (text, bib_buf.getvalue())
+            return rendered
+
+    # Hash before rendering, which patches the entries in local mode
+    hashes = dict((key, entry_hash(key, entries[key], mode)) for key in keys)
+    changed = [key for key in keys if hashes[key] not in cache]
+    if changed:
+        for key, value in render(changed).items():
+            cache[hashes[key]] = value
+    logger.info('`pelican_bibtex` formatted %d of %d entries' % (
+        len(changed), len(keys)))
+
+    current = set(hashes.values())
+    for stale in [h for h in cache if h not in current]:
+        del cache[stale]
+
+    return [(key, entries[key]) + cache[hashes[key]] for key in keys]
+
+
+def shard_publications(publications, shard_dir):
+    """
+    Split the publications into one shard per year, newest first, with
+    undated entries last. Each shard is a dict with its ``name``, the
+    ``count`` and ``publications`` it holds and the ``url`` (relative to the
+    site) of its JSON file.
+    """
+    by_year = {}
+    for pub in publications:
+        by_year.setdefault(pub[1] or '', []).append(pub)
+    years = sorted((year for year in by_year if year), reverse=True)
+    if '' in by_year:
+        years.append('')
+    shards = []
+    for year in years:
+        name = year or 'undated'
+        shards.append({'name': name,
+                       'count': len(by_year[year]),
+                       'url': '%s/%s.json' % (shard_dir, name),
+                       'publications': by_year[year]})
+    return shards
+
+
+def write_shards(pelican_obj):
+    """
+    Write the shards of this build and their index to the output directory.
+
+    Each shard holds a JSON list of ``[key, year, text, bibtex, pdf, slides,
+    poster]`` lists; ``index.json`` lists the shards in page order.
+    """
+    global _pending_shards
+    if _pending_shards is None:
+        return
+    shard_dir, shards = _pending_shards
+    _pending_shards = None
+
+    target = os.path.join(pelican_obj.settings['OUTPUT_PATH'], shard_dir)
+    os.makedirs(target, exist_ok=True)
+    index = []
+    for shard in shards:
+        path = os.path.join(target, shard['name'] + '.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(shard['publications'], f, ensure_ascii=False,
+                      separators=(',', ':'))
+        index.append({'name': shard['name'], 'count': shard['count'],
+                      'url': shard['url']})
+    with open(os.path.join(target, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({'shards': index}, f, ensure_ascii=False,
+                  separators=(',', ':'))
+    logger.info('`pelican_bibtex` wrote %d publication shards to %s' % (
+        len(shards), target))
+
+
+def build_publications(generator):
     """
     Populates context with a list of BibTeX publications.
 
@@ -27,79 +206,95 @@ def add_publications(generator):
     -------------
     generator.settings['PUBLICATIONS_SRC']:
         local path to the BibTeX file to read.
+    generator.settings['BIBTEX_CACHE_PATH']:
+        directory for the cache of formatted entries, kept through
+        ``pelican_data`` when it is enabled; defaults to
+        ``CACHE_PATH/pelican-bibtex``, ``None`` disables it.
+    generator.settings['PUBLICATIONS_SHARD_DIR']:
+        directory, relative to the output, receiving the per-year JSON
+        shards; defaults to ``publications-data``, ``None`` disables them.
 
     Output
     ------
     generator.context['publications']:
         List of tuples (key, year, text, bibtex, pdf, slides, poster).
         See Readme.md for more details.
+    generator.context['publications_shards']:
+        The same publications split by year, see ``shard_publications``.
     """
+    global _pending_shards
     if 'PUBLICATIONS_SRC' not in generator.settings:
         return
     try:
-        from StringIO import StringIO
+        from pybtex.database import PybtexError
     except ImportError:
-        from io import StringIO
-    try:
-        from pybtex.database.input.bibtex import Parser
-        from pybtex.database.output.bibtex import Writer
-        from pybtex.database import BibliographyData, PybtexError
-        from pybtex.backends import html
-        from pybtex.style.formatting import plain
-    except ImportError:
-        logger.warn('`pelican_bibtex` failed to load dependency `pybtex`')
+        logger.warning('`pelican_bibtex` failed to load dependency `pybtex`')
         return
 
     refs_file = generator.settings['PUBLICATIONS_SRC']
+    default_cache = os.path.join(generator.settings.get('CACHE_PATH', 'cache'),
+                                 'pelican-bibtex')
+    cache_path = generator.settings.get('BIBTEX_CACHE_PATH', default_cache)
+    store = cache_store(cache_path)
+    if store is not None:
+        cache = store.load('formatted') or {}
+    else:
+        cache = _memory_cache
+
+    publications = []
     try:
-        bibdata_all = Parser().parse_file(refs_file)
+        for key, entry, text, bibtex in format_entries(refs_file, cache):
+            year = entry.fields.get('year')
+            # This shouldn't really stay in the field dict
+            # but new versions of pybtex don't support pop
+            pdf = entry.fields.get('pdf', None)
+            slides = entry.fields.get('slides', None)
+            poster = entry.fields.get('poster', None)
+
+            publications.append((key,
+                                 year,
+                                 text,
+                                 bibtex,
+                                 pdf,
+                                 slides,
+                                 poster))
     except PybtexError as e:
-        logger.warn('`pelican_bibtex` failed to parse file %s: %s' % (
+        logger.warning('`pelican_bibtex` failed to parse file %s: %s' % (
             refs_file,
             str(e)))
         return
 
-    publications = []
+    if store is not None:
+        store.save('formatted', cache)
+    generator.context['publications'] = publications
 
-    # format entries
-    plain_style = plain.Style()
-    html_backend = html.Backend()
-
-    #hack added by Kyle Cranmer to avoid problems in bib with no journal entry
-    for entry in bibdata_all.entries.values():
-        if 'journal' not in entry.fields: 
-            entry.fields['journal']=''
-        if 'booktitle' not in entry.fields: 
-            entry.fields['booktitle']=''
-
-    formatted_entries = plain_style.format_entries(bibdata_all.entries.values())
-
-    for formatted_entry in formatted_entries:
-        key = formatted_entry.key
-        entry = bibdata_all.entries[key]
-        year = entry.fields.get('year')
-        # This shouldn't really stay in the field dict
-        # but new versions of pybtex don't support pop
-        pdf = entry.fields.get('pdf', None)
-        slides = entry.fields.get('slides', None)
-        poster = entry.fields.get('poster', None)
-
-        #render the bibtex string for the entry
-        bib_buf = StringIO()
-        bibdata_this = BibliographyData(entries={key: entry})
-        Writer().write_stream(bibdata_this, bib_buf)
-        text = formatted_entry.text.render(html_backend)
-
-        publications.append((key,
-                             year,
-                             text,
-                             bib_buf.getvalue(),
-                             pdf,
-                             slides,
-                             poster))
+    shard_dir = generator.settings.get('PUBLICATIONS_SHARD_DIR',
+                                       'publications-data')
+    if shard_dir:
+        shard_dir = shard_dir.strip('/')
+        shards = shard_publications(publications, shard_dir)
+        generator.context['publications_shards'] = shards
+        _pending_shards = (shard_dir, shards)
 
-    generator.context['publications'] = publications
+
+def build_once(generator):
+    """
+    Run ``build_publications`` for the first generator of each build only,
+    for sites without the ``pelican_data`` plugin.
+    """
+    global _built_for
+    if generator.context is _built_for:
+        return
+    _built_for = generator.context
+    build_publications(generator)
 
 
 def register():
-    signals.generator_init.connect(add_publications)
+    # Build once per build through the site's pelican_data plugin, if enabled
+    try:
+        import pelican_data
+    except ImportError:
+        signals.generator_init.connect(build_once)
+    else:
+        pelican_data.register_builder('pelican-bibtex', build_publications)
+    signals.finalized.connect(write_shards)
@@ -12,6 +12,7 @@ setuptools.setup(
 
     # Packaging options:
     include_package_data=True,
+    package_data={'pelican_cite': ['static/*.js']},
 
     # Package dependencies:
     install_requires=['pelican>=4.0', 'pybtex'],
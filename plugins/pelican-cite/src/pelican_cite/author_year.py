@@ -53,24 +53,63 @@ def _strip_nonalnum(parts):
     return _nonalnum_pattern.sub(u'', s)
 
 
+# Labels only depend on a few parts of an entry, and the same people and
+# entries come up in article after article, so both levels are memoized.
+_lab_names = {}
+_labels = {}
+
+
+def _person_key(person):
+    return (tuple(person.prelast()), tuple(person.last()), str(person))
+
+
+def _label_fingerprint(entry):
+    """Return everything in ``entry`` that ``LabelStyle.format_label`` reads."""
+    return (
+        entry.type,
+        entry.key,
+        tuple(_person_key(p) for p in entry.persons.get('author', ())),
+        tuple(_person_key(p) for p in entry.persons.get('editor', ())),
+        entry.fields.get('key'),
+        entry.fields.get('organization'),
+        entry.fields.get('year'),
+    )
+
+
 class LabelStyle(BaseLabelStyle):
     name = 'alpha'
 
     def format_labels(self, sorted_entries):
-        labels = [self.format_label(entry) for entry in sorted_entries]
-        for i in range(len(labels)):
-            labels[i] = labels[i].replace('\\{', '&#123;')
-            labels[i] = labels[i].replace('\\}', '&#125;')
-            labels[i] = labels[i].replace('{', '')
-            labels[i] = labels[i].replace('}', '')
+        labels = [self.clean_label(entry) for entry in sorted_entries]
+        return self.disambiguate(labels)
+
+    def clean_label(self, entry):
+        """Format the label for a single entry, stripping BibTeX braces."""
+        fingerprint = _label_fingerprint(entry)
+        label = _labels.get(fingerprint)
+        if label is None:
+            label = self.format_label(entry)
+            label = label.replace('\\{', '&#123;')
+            label = label.replace('\\}', '&#125;')
+            label = label.replace('{', '')
+            label = label.replace('}', '')
+            _labels[fingerprint] = label
+        return label
+
+    @staticmethod
+    def disambiguate(labels):
+        """
+        Wrap the cleaned labels of a sorted bibliography for display,
+        appending a, b, c... to labels shared by several entries.
+        """
         count = Counter(labels)
         counted = Counter()
         for label in labels:
-            if count[label]:
+            if count[label] == 1:
                 yield '(' + label + ')'
             else:
                 yield '(' + label + chr(ord('a') + counted[label]) + ')'
-                counted.update([label])
+                counted[label] += 1
 
     # note: this currently closely follows the alpha.bst code
     # we should eventually refactor it
@@ -148,6 +187,14 @@ class LabelStyle(BaseLabelStyle):
 
     @staticmethod
     def format_lab_names(persons):
+        key = tuple(_person_key(person) for person in persons)
+        result = _lab_names.get(key)
+        if result is None:
+            result = _lab_names[key] = LabelStyle._format_lab_names(persons)
+        return result
+
+    @staticmethod
+    def _format_lab_names(persons):
         # see alpha.bst format.lab.names
         # s = persons
         numnames = len(persons)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Parsed bibliographies for pelican-cite.
+
+Parsing BibTeX with pybtex is the most expensive step of the plugin. When
+the site's ``pelican_bibliography`` plugin is enabled, files are parsed by
+that shared service, which caches them on disk between builds and shares
+each parse with the other plugins reading the same file. Without it, each
+file is parsed once and kept in memory until it changes.
+
+``CITE_CACHE_PATH`` is the directory of the plugin's own disk cache (the
+rendered fragments, see ``fragments``).
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+cache_path = None
+_parsed = {}
+
+
+def configure(settings):
+    """
+    Set up the on-disk cache location from the Pelican settings.
+
+    ``CITE_CACHE_PATH`` defaults to a ``pelican-cite`` directory inside
+    ``CACHE_PATH``; setting it to ``None`` keeps the cache in memory only.
+    """
+    global cache_path
+    default = os.path.join(settings.get('CACHE_PATH', 'cache'), 'pelican-cite')
+    cache_path = settings.get('CITE_CACHE_PATH', default)
+
+
+def parse_file(refs_file):
+    """
+    Return the parsed ``BibliographyData`` for ``refs_file``.
+
+    The result is shared between all callers, so it must be treated as
+    read-only. Parse errors are raised exactly as pybtex raises them.
+    """
+    try:
+        import pelican_bibliography
+    except ImportError:
+        pass
+    else:
+        return pelican_bibliography.get(refs_file).data
+
+    from pybtex.database.input.bibtex import Parser
+
+    path = os.path.abspath(refs_file)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        # Let pybtex report the missing/unreadable file as a PybtexError
+        return Parser().parse_file(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _parsed.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    data = Parser().parse_file(path)
+    _parsed[path] = (stamp, data)
+    return data
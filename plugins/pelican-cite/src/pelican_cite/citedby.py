@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Reverse citation index for pelican-cite.
+
+While citations are substituted, every published article or page is
+recorded against the canonical keys it cites. The resulting key → posts
+index is put into the template context as ``cited_by`` (so that, for
+example, a publication list can link to the posts discussing a paper) and
+written once to ``cited-by.json`` next to the BibTeX sidecars. Nothing has
+to scan the content a second time to find out who cites what.
+"""
+
+import json
+import logging
+import os
+
+from . import sidecars
+
+logger = logging.getLogger(__name__)
+
+FILE_NAME = 'cited-by.json'
+
+# Shared with the template context of every generator of a build; filled in
+# as content is processed, which happens before any template is rendered.
+cited_by = {}
+# The context of the current build: ``initialized`` is sent once per Pelican
+# instance, so a rebuild (autoreload) is recognized by its new context.
+_context = None
+
+
+def configure(settings):
+    global cited_by, _context
+    cited_by = {}
+    _context = None
+
+
+def attach(generator):
+    """
+    Expose the index to the templates of ``generator``, starting a new index
+    for the first generator of each build.
+    """
+    global cited_by, _context
+    if generator.context is not _context:
+        _context = generator.context
+        cited_by = {}
+    generator.context['cited_by'] = cited_by
+
+
+def add(article, keys):
+    """Record that ``article`` cites each of the canonical ``keys``."""
+    if getattr(article, 'status', 'published') != 'published':
+        return
+    for key in keys:
+        posts = cited_by.setdefault(key, [])
+        if article not in posts:
+            posts.append(article)
+
+
+def _date_key(article):
+    date = getattr(article, 'date', None)
+    return (date is not None, date)
+
+
+def sort():
+    """
+    Order the posts of every key newest first, then by URL, with undated
+    posts last: content is processed in no particular order, and the page
+    and ``cited-by.json`` must not change between builds of the same tree.
+    """
+    for posts in cited_by.values():
+        posts.sort(key=lambda article: article.url)
+        posts.sort(key=_date_key, reverse=True)
+
+
+def write(output_path):
+    """
+    Write the index as ``{"posts": [[url, title], ...], "cites": {key:
+    [post index, ...]}}``, listing each post once however much it cites.
+    """
+    if not cited_by:
+        return
+    sort()
+    posts = []
+    positions = {}
+    cites = {}
+    for key in sorted(cited_by):
+        indices = cites[key] = []
+        for article in cited_by[key]:
+            position = positions.get(id(article))
+            if position is None:
+                position = positions[id(article)] = len(posts)
+                posts.append([article.url, article.title])
+            indices.append(position)
+    target = os.path.join(output_path, sidecars.output_dir)
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, FILE_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'posts': posts, 'cites': cites}, f, ensure_ascii=False,
+                  separators=(',', ':'))
+    logger.info('`pelican-cite` indexed %d cited key(s) in %d post(s)',
+                len(cites), len(posts))
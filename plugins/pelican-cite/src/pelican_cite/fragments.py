@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Formatted entry store for pelican-cite.
+
+Rendering an entry to HTML and serialising it back to BibTeX used to happen
+once per citing article. The store keeps one ``Fragment`` per entry key and
+entry fingerprint for the whole build, so a paper cited in thirty posts is
+rendered once, and persists the fragments in ``CITE_CACHE_PATH`` (with
+``pelican_data``'s ``PickleCache``, when that plugin is enabled) so that
+unchanged entries are not rendered again on the next build either.
+"""
+
+import hashlib
+from collections import namedtuple
+
+from . import bibcache
+
+# Bump whenever the rendering of fragments changes.
+CACHE_VERSION = 2
+
+Fragment = namedtuple('Fragment', ['text', 'label', 'bibtex'])
+
+_fragments = {}
+_used = set()
+_loaded = False
+
+
+def fingerprint(entry):
+    """Return a hash of everything in ``entry`` that affects its rendering."""
+    persons = [(role, [str(person) for person in people])
+               for role, people in entry.persons.items()]
+    state = (entry.original_type, list(entry.fields.items()), persons)
+    return hashlib.sha1(repr(state).encode('utf-8')).hexdigest()
+
+
+def _store():
+    """Return the disk cache of the fragments, or None if there is none."""
+    if not bibcache.cache_path:
+        return None
+    try:
+        import pelican_data
+    except ImportError:
+        return None
+    return pelican_data.PickleCache('`pelican-cite`', CACHE_VERSION, bibcache.cache_path)
+
+
+def _load():
+    global _loaded
+    _loaded = True
+    store = _store()
+    fragments = store and store.load('fragments')
+    if fragments:
+        _fragments.update(fragments)
+
+
+def ensure_loaded():
+    """Load the persisted fragments, if that has not happened yet."""
+    if not _loaded:
+        _load()
+
+
+def remember(key, fingerprint, fragment):
+    """Add a fragment rendered elsewhere (e.g. in a worker) to the store."""
+    _fragments[(key, fingerprint)] = fragment
+    _used.add((key, fingerprint))
+
+
+def lookup(record, render):
+    """
+    Return the ``Fragment`` for an ``EntryRecord``, calling
+    ``render(record.entry)`` to build it when the entry has not been seen
+    with its current contents before.
+    """
+    ensure_loaded()
+    key = (record.key, record.fingerprint)
+    _used.add(key)
+    fragment = _fragments.get(key)
+    if fragment is None:
+        fragment = Fragment(*render(record.entry))
+        _fragments[key] = fragment
+    return fragment
+
+
+def save():
+    """Persist the fragments used during this build, dropping stale ones."""
+    store = _store()
+    if store is None or not _used:
+        return
+    store.save('fragments', {key: _fragments[key] for key in _used})
+    _used.clear()
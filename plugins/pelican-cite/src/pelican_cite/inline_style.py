@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Inline citation style for pelican-cite.
+
+Importing this module loads the parts of pybtex needed to format entries,
+and constructing the style runs pybtex's plugin discovery, so pelican-cite
+only does either once some content actually cites something.
+"""
+
+from pybtex.backends import html
+from pybtex.style.formatting import toplevel
+from pybtex.style.formatting.unsrt import dashify, Style as UnsrtStyle
+from pybtex.style.template import (
+    join, words, field, optional, first_of, sentence, tag, optional_field,
+)
+from pybtex.plugin import find_plugin
+
+from .author_year import LabelStyle
+
+
+class Style(UnsrtStyle):
+    name = 'inline'
+    default_sorting_style = 'author_year_title'
+    default_label_style = 'author_year'
+
+    def __init__(self, label_style=None, name_style=None, sorting_style=None, abbreviate_names=False, **kwargs):
+        self.name_style = find_plugin('pybtex.style.names', name_style or self.default_name_style)()
+        self.label_style = LabelStyle()
+        self.sorting_style = find_plugin('pybtex.style.sorting', sorting_style or self.default_sorting_style)()
+        self.format_name = self.name_style.format
+        self.format_labels = self.label_style.format_labels
+        self.sort = self.sorting_style.sort
+        self.abbreviate_names = abbreviate_names
+
+    def get_article_template(self, e):
+        pages = field('pages', apply_func=dashify)
+        date = words[optional_field('month'), field('year')]
+        volume_and_pages = first_of[
+            # volume and pages, with optional issue number
+            optional[
+                join[
+                    field('volume'),
+                    optional['(', field('number'), ')'],
+                    ':', pages
+                ],
+            ],
+            # pages only
+            words['pages', pages],
+        ]
+        template = toplevel[
+            self.format_names('author'),
+            self.format_title(e, 'title'),
+            sentence[
+                tag('em')[first_of[
+                              optional[field('journal')],
+                              optional[field('journaltitle')],
+                          ],
+                ],
+                optional[volume_and_pages],
+                date],
+            sentence[optional_field('note')],
+            self.format_web_refs(e),
+        ]
+        return template
+
+
+_style = None
+_backend = None
+
+
+def get_style():
+    """Return the shared ``Style`` and HTML backend, creating them once."""
+    global _style, _backend
+    if _style is None:
+        _style = Style()
+        _backend = html.Backend()
+    return _style, _backend
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Citation key index for pelican-cite.
+
+Resolving the keys cited by an article used to mean walking every entry of
+the bibliography. The index is built once per parsed bibliography and maps
+the keys an author may write (the exact key, its lower-cased form and any
+aliases listed in a biblatex ``ids`` field) to the canonical entry key, so
+that resolving a post's citations costs time proportional to the number of
+citations rather than the size of the bibliography. The same pass builds
+the normalized ``EntryRecord`` of every entry.
+"""
+
+import weakref
+
+from .fragments import fingerprint
+from .records import EntryRecord, normalize_entry
+
+# BibliographyData is unhashable, so indexes are keyed by object id and
+# dropped when the bibliography they describe is garbage collected.
+_indexes = {}
+
+
+class KeyIndex(object):
+    """
+    Lookup table from written citation keys to canonical entry keys, plus
+    the ``EntryRecord`` of each canonical key.
+    """
+
+    __slots__ = ('exact', 'folded', 'records')
+
+    def __init__(self, data):
+        self.exact = {}
+        self.folded = {}
+        self.records = {}
+        for position, key in enumerate(data.entries.keys()):
+            entry = normalize_entry(data.entries[key])
+            self.records[key] = EntryRecord(key, entry, position, fingerprint(entry))
+            self.exact[key] = key
+            self.folded.setdefault(key.lower(), key)
+            for alias in entry.fields.get('ids', '').split(','):
+                alias = alias.strip()
+                if alias:
+                    self.folded.setdefault(alias.lower(), key)
+
+    def resolve(self, key):
+        """Return the canonical key for ``key``, or ``None`` if unknown."""
+        canonical = self.exact.get(key)
+        if canonical is None:
+            canonical = self.folded.get(key.lower())
+        return canonical
+
+
+def get_index(data):
+    """Return the ``KeyIndex`` for a parsed bibliography, building it once."""
+    index = _indexes.get(id(data))
+    if index is None:
+        index = _indexes[id(data)] = KeyIndex(data)
+        weakref.finalize(data, _indexes.pop, id(data), None)
+    return index
@@ -9,286 +9,292 @@ pelican sites.
 Based on teh Pelican BibTeX plugin written by Vlad Niculae <vlad@vene.ro>
 """
 
+import importlib.util
 import logging
 import re
 import sys
-import urllib.parse
+from html import escape as html_escape
 
 try:
     from io import StringIO
 except ImportError:
     from StringIO import StringIO
 
-try:
-    from pybtex.database.input.bibtex import Parser
-    from pybtex.database.output.bibtex import Writer
-    from pybtex.database import BibliographyData, PybtexError, Entry
-    from pybtex.backends import html
-    from pybtex.style.formatting import toplevel
-    from pybtex.style.formatting.unsrt import dashify, Style as UnsrtStyle
-    from pybtex.style.template import (
-        join, words, field, optional, first_of, sentence, tag, optional_field,
-    )
-    from pybtex.plugin import find_plugin
-
-    pyb_imported = True
-except ImportError:
-    pyb_imported = False
+# pybtex is only imported once content cites something; see inline_style.
+pyb_imported = importlib.util.find_spec('pybtex') is not None
 
 from pelican import signals
 from pelican.contents import Static
-from .author_year import LabelStyle
+from . import bibcache, citedby, fragments, keyindex, sidecars, workers
 
 __version__ = '1.0.0'
 
 JUMP_BACK = '<a class="cite-backref" href="#ref-{0}-{1}" title="Jump back to reference {1}">{2}</a>'
-CITE_RE = re.compile(r"\[&#64;(&#64;)?\s*(\w.*?)\s*\]")
-DATE_RE = re.compile(r"(?P<y>\d{4})(?:-(?P<m>\d{1,2})(?:-(?P<d>\d{1,2}))?)?")
+# Matches a citation (raw or already escaped) or any other bare "@" sign
+TOKEN_RE = re.compile(r"\[(?:@|&#64;)(@|&#64;)?\s*(\w.*?)\s*\]|@")
+# Cheap test for content that may contain a citation at all
+CITE_MARKS = ('[@', '[&#64;')
 CITE_2_RE = re.compile(r">\s*\(\s*(.*?),\s*(.*?)\s*\)\s*<")
-
-
-class Style(UnsrtStyle):
-    name = 'inline'
-    default_sorting_style = 'author_year_title'
-    default_label_style = 'author_year'
-
-    def __init__(self, label_style=None, name_style=None, sorting_style=None, abbreviate_names=False, **kwargs):
-        self.name_style = find_plugin('pybtex.style.names', name_style or self.default_name_style)()
-        self.label_style = LabelStyle()
-        self.sorting_style = find_plugin('pybtex.style.sorting', sorting_style or self.default_sorting_style)()
-        self.format_name = self.name_style.format
-        self.format_labels = self.label_style.format_labels
-        self.sort = self.sorting_style.sort
-        self.abbreviate_names = abbreviate_names
-
-    def get_article_template(self, e):
-        pages = field('pages', apply_func=dashify)
-        date = words[optional_field('month'), field('year')]
-        volume_and_pages = first_of[
-            # volume and pages, with optional issue number
-            optional[
-                join[
-                    field('volume'),
-                    optional['(', field('number'), ')'],
-                    ':', pages
-                ],
-            ],
-            # pages only
-            words['pages', pages],
-        ]
-        template = toplevel[
-            self.format_names('author'),
-            self.format_title(e, 'title'),
-            sentence[
-                tag('em')[first_of[
-                              optional[field('journal')],
-                              optional[field('journaltitle')],
-                          ],
-                ],
-                optional[volume_and_pages],
-                date],
-            sentence[optional_field('note')],
-            self.format_web_refs(e),
-        ]
-        return template
+# The content lists of the article and page generators
+CONTENT_LISTS = ('articles', 'translations', 'hidden_articles', 'hidden_translations',
+                 'drafts', 'drafts_translations', 'pages', 'hidden_pages',
+                 'draft_pages', 'draft_translations')
 
 
 logger = logging.getLogger(__name__)
 global_bib = None
+global_src = None
 
-# Modal and script for BibTeX display
-BIBTEX_MODAL = '''
-<script type="text/javascript">
-    function showCiteBibtex(bibtex) {
-        var formatted = bibtex.replace(/\\\\n/g, '\\n');
-        document.getElementById('cite-bibtex-content').textContent = formatted;
-        $('#citeBibtexModal').modal('show');
-    }
-    function copyCiteBibtex() {
-        var bibtexText = document.getElementById('cite-bibtex-content').textContent;
-        navigator.clipboard.writeText(bibtexText).then(function() {
-            var btn = document.getElementById('cite-copy-btn');
-            btn.textContent = 'Copied!';
-            btn.className = 'btn btn-success';
-            setTimeout(function() {
-                btn.textContent = 'Copy to Clipboard';
-                btn.className = 'btn btn-primary';
-            }, 2000);
-        });
-    }
-</script>
-<div class="modal fade" id="citeBibtexModal" tabindex="-1" role="dialog" aria-labelledby="citeBibtexModalLabel">
-  <div class="modal-dialog modal-lg" role="document">
-    <div class="modal-content">
-      <div class="modal-header">
-        <button type="button" class="close" data-dismiss="modal" aria-label="Close"><span aria-hidden="true">&times;</span></button>
-        <h4 class="modal-title" id="citeBibtexModalLabel">BibTeX Entry</h4>
-      </div>
-      <div class="modal-body">
-        <pre id="cite-bibtex-content" style="white-space: pre-wrap; word-wrap: break-word; background: #f5f5f5; padding: 15px; border-radius: 4px;"></pre>
-      </div>
-      <div class="modal-footer">
-        <button type="button" id="cite-copy-btn" class="btn btn-primary" onclick="copyCiteBibtex()">Copy to Clipboard</button>
-        <button type="button" class="btn btn-default" data-dismiss="modal">Close</button>
-      </div>
-    </div>
-  </div>
-</div>
-'''
-
-bibliography_start = '<hr>\n<h2>Bibliography</h2>\n' + BIBTEX_MODAL
+bibliography_start = '<hr>\n<h2>Bibliography</h2>\n'
 bibliography_end = ''
-if pyb_imported:
-    style = Style()
-    backend = html.Backend()
-else:
-    style = None
-    backend = None
+_global_parsed = False
 
 
-def get_bib_file(article):
+def get_global_source():
+    """
+    Return the path and parsed object of ``PUBLICATIONS_SRC``, parsing it
+    the first time some content needs it.
+    """
+    global global_bib, global_src, _global_parsed
+    from pybtex.database import PybtexError
+
+    if not _global_parsed:
+        _global_parsed = True
+        refs_file = global_src
+        global_src = None
+        if refs_file is not None:
+            try:
+                global_bib = bibcache.parse_file(refs_file)
+                global_src = refs_file
+            except PybtexError as e:
+                logger.warning('`pelican_bibtex` failed to parse file %s: %s' % (
+                    refs_file,
+                    str(e)))
+    return global_src, global_bib
+
+
+def get_bib_source(article):
     """
     If a bibliography file is specified for this article/page, parse
-    it and return the parsed object.
+    it and return its path and the parsed object; otherwise return
+    the global ones.
     """
+    from pybtex.database import PybtexError
+
     if 'publications_src' in article.metadata:
         refs_file = article.metadata['publications_src']
         try:
-            local_bib = Parser().parse_file(refs_file)
-            return local_bib
+            local_bib = bibcache.parse_file(refs_file)
+            return refs_file, local_bib
         except PybtexError as e:
             logger.warning('`pelican_bibtex` failed to parse file %s: %s' % (
                 refs_file,
                 str(e)))
-            return global_bib
+            return get_global_source()
     else:
-        return global_bib
+        return get_global_source()
 
 
-def process_content(article):
-    """
-    Substitute the citations and add a bibliography for an article or
-    page, using the local bib file if specified or the global one otherwise.
+def scan_citations(content):
     """
-    data = get_bib_file(article)
-    if not data:
-        return
-    content = article._content
-    content = content.replace("@", "&#64;")
+    Tokenize ``content`` in a single pass.
 
-    # Scan post to figure out what citations are needed
+    Returns the content split into a list of plain strings (with every ``@``
+    already escaped as ``&#64;``) and citation tuples ``(key, double, raw)``,
+    together with the number of citations of each key as written.
+    """
+    parts = []
     cite_count = {}
-    replace_count = {}
-    for citation in CITE_RE.findall(content):
-        if citation[1] not in cite_count:
-            cite_count[citation[1]] = 1
-            replace_count[citation[1]] = 1
-        else:
-            cite_count[citation[1]] += 1
+    pos = 0
+    for match in TOKEN_RE.finditer(content):
+        start = match.start()
+        if pos < start:
+            parts.append(content[pos:start])
+        pos = match.end()
+        if match.group(2) is None:
+            parts.append('&#64;')
+            continue
+        raw = match.group(0).replace('@', '&#64;')
+        key = match.group(2).replace('@', '&#64;')
+        cite_count[key] = cite_count.get(key, 0) + 1
+        parts.append((key, '&#64;&#64;' in raw, raw))
+    if pos < len(content):
+        parts.append(content[pos:])
+    return parts, cite_count
+
+
+def inline_label(label):
+    """Turn an ``(Author, Year)`` label into the ``Author (Year)`` form."""
+    m = CITE_2_RE.search(label)
+    if not m:
+        return label
+    return label[0:m.start()] + '>' + m.group(1) + ' (' + m.group(2) + ')<' + label[m.end():]
+
+
+def render_fragment(entry):
+    """
+    Render the HTML text, author-year label and BibTeX source of a single
+    entry. Called once per entry and build through the fragment store.
+    """
+    from pybtex.database import BibliographyData
+    from pybtex.database.output.bibtex import Writer
+    from .inline_style import get_style
 
-    # Get formatted entries for the appropriate bibliographic entries
-    cited = []
-    for key in data.entries.keys():
-        if key in cite_count:
-            cited.append(data.entries[key])
-    if len(cited) == 0:
-        return
+    style, backend = get_style()
+    formatted_entry = style.format_entry(None, entry)
+    t = formatted_entry.text.render(backend)
+    t = t.replace('\\{', '&#123;')
+    t = t.replace('\\}', '&#125;')
+    t = t.replace('{', '')
+    t = t.replace('}', '')
+
+    # Generate BibTeX string for this entry
+    bib_buf = StringIO()
+    bibdata_this = BibliographyData(entries={entry.key: entry})
+    Writer().write_stream(bibdata_this, bib_buf)
+
+    return t, style.label_style.clean_label(entry), bib_buf.getvalue()
 
-    # Patch entries, adding missing things to workaround style expecting fields
-    # that are not there
-    for entry in cited:  # type: Entry
-        # Zotero at least exports with "date" instead of separate "year" etc.
-        if 'year' not in entry.fields and 'date' in entry.fields:
-            date_parse = DATE_RE.match(entry.fields['date'])
-            if date_parse:
-                groups = date_parse.groupdict()
-                if groups['y']:
-                    entry.fields['year'] = groups['y']
-                if groups['m']:
-                    entry.fields['month'] = groups['m']
-                if groups['d']:
-                    entry.fields['day'] = groups['d']
-    formatted_entries = style.format_entries(cited)
-
-    # Get the data for the required citations and append to content
+
+def cite_content(content, index, sidecar_src):
+    """
+    Substitute the citations in ``content`` and append a bibliography, using
+    the ``KeyIndex`` of the bibliography to cite from.
+
+    Returns ``None`` when nothing in ``content`` can be cited. Otherwise
+    returns the new content, the ``(key, fingerprint, fragment)`` triples of
+    the cited entries and the keys that could not be found. Only shared,
+    read-only state is used, so this also runs in worker processes.
+    """
+    # Scan post to figure out what citations are needed
+    parts, cite_count = scan_citations(content)
+    if not cite_count:
+        return None
+    from .inline_style import get_style
+    style = get_style()[0]
+
+    # Resolve the cited keys (including case variants and aliases) to
+    # entries, keeping the order of the bibliography file
+    resolved = {}
+    entry_count = {}
+    for key, count in cite_count.items():
+        canonical = index.resolve(key)
+        if canonical is not None:
+            resolved[key] = canonical
+            entry_count[canonical] = entry_count.get(canonical, 0) + count
+    if len(entry_count) == 0:
+        return None
+    records = [index.records[key]
+               for key in sorted(entry_count, key=lambda canonical: index.records[canonical].position)]
+    by_entry = {id(record.entry): record for record in records}
+
+    sorted_records = [by_entry[id(entry)]
+                      for entry in style.sort([record.entry for record in records])]
+    entry_fragments = [fragments.lookup(record, render_fragment)
+                       for record in sorted_records]
+    entry_labels = style.label_style.disambiguate(
+        [fragment.label for fragment in entry_fragments])
+
+    # Get the data for the required citations and build the bibliography
     labels = {}
-    content += bibliography_start
-    for formatted_entry in formatted_entries:
-        key = formatted_entry.key
-        entry = data.entries[key]
+    cited = []
+    bibliography = [bibliography_start, sidecars.script_tag()]
+    sidecar_src = html_escape(sidecar_src)
+    for record, fragment, entry_label in zip(sorted_records, entry_fragments, entry_labels):
+        key = record.key
         ref_id = key.replace(' ', '')
         label = ("<a href='#" + ref_id + "' id='ref-" + ref_id + "-{0}'>"
-                 + formatted_entry.label + "</a>")
-        t = formatted_entry.text.render(backend)
-        t = t.replace('\\{', '&#123;')
-        t = t.replace('\\}', '&#125;')
-        t = t.replace('{', '')
-        t = t.replace('}', '')
-
-        # Generate BibTeX string for this entry
-        bib_buf = StringIO()
-        bibdata_this = BibliographyData(entries={key: entry})
-        Writer().write_stream(bibdata_this, bib_buf)
-        bibtex_str = bib_buf.getvalue()
-        bibtex_encoded = urllib.parse.quote(bibtex_str)
-        bibtex_link = (" [<a href=\"javascript:void(0);\" onclick=\"showCiteBibtex(decodeURIComponent('"
-                      + bibtex_encoded + "'));\">Bibtex</a>]")
-
-        text = ("<p id='" + ref_id + "'>" + t)
-        text += bibtex_link
-        for i in range(cite_count[key]):
+                 + entry_label + "</a>")
+        cited.append((key, record.fingerprint, fragment))
+        bibliography.append("<p id='" + ref_id + "'>" + fragment.text)
+        bibliography.append(" [<a href=\"javascript:void(0);\" data-cite-key=\"" + html_escape(key)
+                            + "\" data-cite-src=\"" + sidecar_src
+                            + "\" onclick=\"showCiteBibtex(this);\">Bibtex</a>]")
+        for i in range(entry_count[key]):
             if i == 0:
-                text += ' ' + JUMP_BACK.format(ref_id, 1, '↩')
-                if cite_count[key] > 1:
-                    text += JUMP_BACK.format(ref_id, 1, ' <sup>1</sup> ')
+                bibliography.append(' ' + JUMP_BACK.format(ref_id, 1, '↩'))
+                if entry_count[key] > 1:
+                    bibliography.append(JUMP_BACK.format(ref_id, 1, ' <sup>1</sup> '))
             else:
-                text += JUMP_BACK.format(ref_id, i + 1, '<sup>' + str(i + 1) + '</sup> ')
-        text += '</p>'
-        content += text + '\n'
-        labels[key] = label
-
-    content += bibliography_end
+                bibliography.append(JUMP_BACK.format(ref_id, i + 1, '<sup>' + str(i + 1) + '</sup> '))
+        bibliography.append('</p>\n')
+        labels[key] = (label, inline_label(label))
+    bibliography.append(bibliography_end)
 
     # Replace citations in article/page
-    cite_count = {}
-
-    def replace_cites(match):
-        label = match.group(2)
-        if label in labels:
-            if label not in cite_count:
-                cite_count[label] = 1
-                replace_count[label] = 1
-            else:
-                cite_count[label] += 1
-            lab = labels[label].format(cite_count[label])
-            if '&#64;&#64;' in match.group():
-                return lab
-            else:
-                m = CITE_2_RE.search(lab)
-                lab = lab[0:m.start()] + '>' + m.group(1) + ' (' + m.group(2) + ')<' + lab[m.end():]
-                return lab
+    out = []
+    missing = []
+    numbers = {}
+    for part in parts:
+        if part.__class__ is str:
+            out.append(part)
+            continue
+        key, double, raw = part
+        canonical = resolved.get(key)
+        if canonical is not None:
+            number = numbers[canonical] = numbers.get(canonical, 0) + 1
+            out.append(labels[canonical][0 if double else 1].format(number))
         else:
-            logger.warning('No BibTeX entry found for key "{}"'.format(label))
-            return match.group(0)
+            missing.append(key)
+            out.append(raw)
+    out.extend(bibliography)
+    return ''.join(out), cited, missing
+
 
-    content = CITE_RE.sub(replace_cites, content)
+def apply_citations(article, sidecar, content, cited, missing):
+    """
+    Store the result of ``cite_content`` on the article and the caches.
+
+    The sidecar entries are also kept on the article itself, so that they
+    can be recorded again when Pelican restores it from its content cache
+    (see ``restore_cached``).
+    """
+    for key in missing:
+        logger.warning('No BibTeX entry found for key "{}"'.format(key))
+    for key, fingerprint, fragment in cited:
+        fragments.remember(key, fingerprint, fragment)
+        sidecars.add(sidecar, key, fragment.bibtex)
+    citedby.add(article, [key for key, _, _ in cited])
     article._content = content
+    article._pelican_cite = (sidecar, [(key, fragment.bibtex)
+                                       for key, _, fragment in cited])
+
+
+def process_content(article):
+    """
+    Substitute the citations and add a bibliography for an article or
+    page, using the local bib file if specified or the global one otherwise.
+    """
+    refs_file, data = get_bib_source(article)
+    if not data:
+        return
+    sidecar = sidecars.sidecar_name(refs_file)
+    result = cite_content(article._content, keyindex.get_index(data),
+                          sidecars.url(sidecar))
+    if result is not None:
+        apply_citations(article, sidecar, *result)
 
 
 def add_citations(content):
     if isinstance(content, Static):
         return
 
-    global global_bib
     if not pyb_imported:
         logger.warning('`pelican-cite` failed to load dependency `pybtex`')
         return
 
-    process_content(content)
+    # Nothing to do (and no reason to load a bibliography) without citations
+    if not any(mark in content._content for mark in CITE_MARKS):
+        return
+    if workers.enabled():
+        workers.defer(content)
+    else:
+        process_content(content)
 
 
 def init(pelican_instance):
-    global global_bib, bibliography_start, bibliography_end
+    global global_bib, global_src, _global_parsed
+    global bibliography_start, bibliography_end
     if not pyb_imported:
         logger.warning('`pelican-cite` failed to load dependency `pybtex`')
         return
@@ -298,16 +304,54 @@ def init(pelican_instance):
     if 'BIBLIOGRAPHY_END' in pelican_instance.settings:
         bibliography_end = pelican_instance.settings['BIBLIOGRAPHY_END']
 
-    if 'PUBLICATIONS_SRC' in pelican_instance.settings:
-        refs_file = pelican_instance.settings['PUBLICATIONS_SRC']
-        try:
-            global_bib = Parser().parse_file(refs_file)
-        except PybtexError as e:
-            logger.warning('`pelican_bibtex` failed to parse file %s: %s' % (
-                refs_file,
-                str(e)))
+    bibcache.configure(pelican_instance.settings)
+    sidecars.configure(pelican_instance.settings)
+    citedby.configure(pelican_instance.settings)
+    workers.configure(pelican_instance.settings)
+
+    # Parsed by get_global_source() once some content cites something
+    global_bib = None
+    global_src = pelican_instance.settings.get('PUBLICATIONS_SRC')
+    _global_parsed = False
+
+
+def restore_cached(generator):
+    """
+    Record the sidecar entries and the citing posts of the content of
+    ``generator`` that was processed in an earlier build. With ``CONTENT_CACHING_LAYER =
+    'generator'``, Pelican restores such content from its cache without
+    sending ``content_object_init``; recording content processed in this
+    build again does nothing.
+    """
+    for name in CONTENT_LISTS:
+        for content in getattr(generator, name, None) or ():
+            record = getattr(content, '_pelican_cite', None)
+            if record is None:
+                continue
+            sidecar, entries = record
+            for key, bibtex in entries:
+                sidecars.add(sidecar, key, bibtex)
+            citedby.add(content, [key for key, _ in entries])
+
+
+def process_deferred(generator):
+    if pyb_imported:
+        workers.run()
+        restore_cached(generator)
+        citedby.sort()
+
+
+def finalize(pelican_instance):
+    if pyb_imported:
+        fragments.save()
+        citedby.write(pelican_instance.settings['OUTPUT_PATH'])
+        sidecars.write(pelican_instance.settings['OUTPUT_PATH'])
 
 
 def register():
     signals.initialized.connect(init)
+    signals.generator_init.connect(citedby.attach)
     signals.content_object_init.connect(add_citations)
+    signals.article_generator_finalized.connect(process_deferred)
+    signals.page_generator_finalized.connect(process_deferred)
+    signals.finalized.connect(finalize)
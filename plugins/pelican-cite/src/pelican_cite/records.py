@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Normalized entry records for pelican-cite.
+
+Every entry of a bibliography is normalized once, when its key index is
+built, into a small read-only ``EntryRecord``. Articles only ever read these
+records, so no per-article work patches the shared pybtex entries and the
+records can be handed to several workers at once.
+"""
+
+import re
+
+DATE_RE = re.compile(r"(?P<y>\d{4})(?:-(?P<m>\d{1,2})(?:-(?P<d>\d{1,2}))?)?")
+
+
+def normalize_entry(entry):
+    """
+    Return ``entry`` with the fields the citation style expects filled in.
+
+    Zotero at least exports with "date" instead of separate "year" etc., so
+    such entries are copied with ``year``/``month``/``day`` derived from the
+    date. Any other entry is returned unchanged; the parsed entry itself is
+    never modified.
+    """
+    from pybtex.database import Entry
+
+    if 'year' in entry.fields or 'date' not in entry.fields:
+        return entry
+    date_parse = DATE_RE.match(entry.fields['date'])
+    if not date_parse:
+        return entry
+    fields = list(entry.fields.items())
+    groups = date_parse.groupdict()
+    if groups['y']:
+        fields.append(('year', groups['y']))
+    if groups['m']:
+        fields.append(('month', groups['m']))
+    if groups['d']:
+        fields.append(('day', groups['d']))
+    normalized = Entry(entry.original_type, fields=fields, persons=entry.persons)
+    normalized.key = entry.key
+    return normalized
+
+
+class EntryRecord(object):
+    """Normalized, read-only view of one bibliography entry."""
+
+    __slots__ = ('key', 'entry', 'position', 'fingerprint')
+
+    def __init__(self, key, entry, position, fingerprint):
+        object.__setattr__(self, 'key', key)
+        object.__setattr__(self, 'entry', entry)
+        object.__setattr__(self, 'position', position)
+        object.__setattr__(self, 'fingerprint', fingerprint)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('EntryRecord is read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('EntryRecord is read-only')
+
+    def __reduce__(self):
+        return (EntryRecord, (self.key, self.entry, self.position, self.fingerprint))
+
+    def __repr__(self):
+        return 'EntryRecord({0!r})'.format(self.key)
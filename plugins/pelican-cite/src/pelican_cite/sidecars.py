@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+BibTeX sidecars for pelican-cite.
+
+Instead of inlining the URL-encoded BibTeX of every reference into each
+article, the BibTeX of the entries cited from a bibliography file is
+collected during the build and written once to a compact JSON file next to
+the modal script. Articles only reference an entry by key; the reader's
+browser fetches the sidecar the first time "Bibtex" is clicked.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_NAME = 'pelican-cite.js'
+SCRIPT_SOURCE = os.path.join(os.path.dirname(__file__), 'static', SCRIPT_NAME)
+
+output_dir = 'pelican-cite'
+site_url = ''
+_sidecars = {}
+
+
+def configure(settings):
+    """
+    Read the output location from the settings. ``CITE_OUTPUT_DIR`` is the
+    directory, relative to ``OUTPUT_PATH``, receiving the script and the
+    sidecars.
+    """
+    global output_dir, site_url
+    output_dir = settings.get('CITE_OUTPUT_DIR', 'pelican-cite').strip('/')
+    site_url = settings.get('SITEURL', '')
+    _sidecars.clear()
+
+
+def sidecar_name(refs_file):
+    """Return the sidecar file name used for a bibliography file."""
+    path = os.path.abspath(refs_file)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]
+    return '{0}-{1}.json'.format(stem, digest)
+
+
+def url(name):
+    return '{0}/{1}/{2}'.format(site_url, output_dir, name)
+
+
+def script_tag():
+    return '<script src="{0}"></script>\n'.format(url(SCRIPT_NAME))
+
+
+def add(name, key, bibtex):
+    """Record the BibTeX of a cited entry for the sidecar ``name``."""
+    _sidecars.setdefault(name, {})[key] = bibtex
+
+
+def write(output_path):
+    """Write the modal script and every sidecar collected during the build."""
+    if not _sidecars:
+        return
+    target = os.path.join(output_path, output_dir)
+    os.makedirs(target, exist_ok=True)
+    shutil.copyfile(SCRIPT_SOURCE, os.path.join(target, SCRIPT_NAME))
+    for name, entries in _sidecars.items():
+        with open(os.path.join(target, name), 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, sort_keys=True,
+                      separators=(',', ':'))
+    logger.info('`pelican-cite` wrote %d BibTeX sidecar(s) to %s',
+                len(_sidecars), target)
+    _sidecars.clear()
@@ -0,0 +1,77 @@
+/*
+ * BibTeX modal for pelican-cite bibliographies.
+ *
+ * Bibliography items carry the key of their entry and the URL of the JSON
+ * sidecar holding the BibTeX source of every cited entry. The sidecar is
+ * fetched on the first click only and the modal markup is created on demand,
+ * so articles do not need to embed either.
+ */
+var citeBibtexSources = {};
+
+function loadCiteBibtex(src) {
+    if (!citeBibtexSources[src]) {
+        citeBibtexSources[src] = fetch(src).then(function(response) {
+            if (!response.ok) {
+                throw new Error('Failed to load ' + src);
+            }
+            return response.json();
+        });
+    }
+    return citeBibtexSources[src];
+}
+
+function citeBibtexModal() {
+    var modal = document.getElementById('citeBibtexModal');
+    if (modal) {
+        return modal;
+    }
+    var container = document.createElement('div');
+    container.innerHTML =
+        '<div class="modal fade" id="citeBibtexModal" tabindex="-1" role="dialog" aria-labelledby="citeBibtexModalLabel">' +
+        '  <div class="modal-dialog modal-lg" role="document">' +
+        '    <div class="modal-content">' +
+        '      <div class="modal-header">' +
+        '        <button type="button" class="close" data-dismiss="modal" aria-label="Close"><span aria-hidden="true">&times;</span></button>' +
+        '        <h4 class="modal-title" id="citeBibtexModalLabel">BibTeX Entry</h4>' +
+        '      </div>' +
+        '      <div class="modal-body">' +
+        '        <pre id="cite-bibtex-content" style="white-space: pre-wrap; word-wrap: break-word; background: #f5f5f5; padding: 15px; border-radius: 4px;"></pre>' +
+        '      </div>' +
+        '      <div class="modal-footer">' +
+        '        <button type="button" id="cite-copy-btn" class="btn btn-primary" onclick="copyCiteBibtex()">Copy to Clipboard</button>' +
+        '        <button type="button" class="btn btn-default" data-dismiss="modal">Close</button>' +
+        '      </div>' +
+        '    </div>' +
+        '  </div>' +
+        '</div>';
+    modal = container.firstChild;
+    document.body.appendChild(modal);
+    return modal;
+}
+
+function showCiteBibtex(link) {
+    var key = link.getAttribute('data-cite-key');
+    var src = link.getAttribute('data-cite-src');
+    citeBibtexModal();
+    var content = document.getElementById('cite-bibtex-content');
+    content.textContent = 'Loading...';
+    $('#citeBibtexModal').modal('show');
+    loadCiteBibtex(src).then(function(entries) {
+        content.textContent = entries[key] || 'No BibTeX entry found for ' + key;
+    }, function(error) {
+        content.textContent = error.message;
+    });
+}
+
+function copyCiteBibtex() {
+    var bibtexText = document.getElementById('cite-bibtex-content').textContent;
+    navigator.clipboard.writeText(bibtexText).then(function() {
+        var btn = document.getElementById('cite-copy-btn');
+        btn.textContent = 'Copied!';
+        btn.className = 'btn btn-success';
+        setTimeout(function() {
+            btn.textContent = 'Copy to Clipboard';
+            btn.className = 'btn btn-primary';
+        }, 2000);
+    });
+}
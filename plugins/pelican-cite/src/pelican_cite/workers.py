@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Process pool mode for pelican-cite.
+
+By default citations are substituted synchronously from the
+``content_object_init`` signal, one article at a time. With
+``CITE_WORKERS`` set, articles that contain citations are only queued there;
+once a generator has read all of its content the queue is handed to a pool
+of forked worker processes. The key indexes the workers cite from are
+serialized once per batch and handed to each worker when it starts, so a
+job only carries the article text and the worker only returns the new text
+and the fragments it rendered. Everything the parent keeps (the fragment
+store, the sidecars and the warnings) is merged in the parent.
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from . import fragments, keyindex, sidecars
+
+logger = logging.getLogger(__name__)
+
+size = 1
+_pending = []
+_snapshot = None
+
+
+def configure(settings):
+    """
+    Read ``CITE_WORKERS``: ``1`` (the default) processes content
+    synchronously, ``0`` uses one worker per CPU.
+
+    Workers rewrite articles after their generator has pickled them into the
+    content cache, so pool mode is refused when Pelican caches (or loads)
+    whole articles: the cache would hold, and later builds serve, content
+    without citations.
+    """
+    global size
+    size = settings.get('CITE_WORKERS', 1)
+    if not size:
+        size = os.cpu_count() or 1
+    if (size > 1 and settings.get('CONTENT_CACHING_LAYER') == 'generator'
+            and (settings.get('CACHE_CONTENT') or settings.get('LOAD_CONTENT_CACHE'))):
+        logger.warning('`pelican-cite` CITE_WORKERS is incompatible with the '
+                       'generator-level content cache, processing content synchronously')
+        size = 1
+    del _pending[:]
+
+
+def enabled():
+    return size > 1
+
+
+def defer(article):
+    """Queue ``article`` for the next ``run``."""
+    _pending.append(article)
+
+
+def _init_worker(payload):
+    global _snapshot
+    _snapshot = pickle.loads(payload)
+
+
+def _run_job(job):
+    from .pelican_cite import cite_content
+
+    content, sidecar, src = job
+    return cite_content(content, _snapshot[sidecar], src)
+
+
+def _fork_context():
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
+def run():
+    """Substitute the citations of every queued article."""
+    from .pelican_cite import apply_citations, cite_content, get_bib_source
+
+    pending = list(_pending)
+    del _pending[:]
+    jobs = []
+    indexes = {}
+    for article in pending:
+        refs_file, data = get_bib_source(article)
+        if not data:
+            continue
+        sidecar = sidecars.sidecar_name(refs_file)
+        if sidecar not in indexes:
+            indexes[sidecar] = keyindex.get_index(data)
+        jobs.append((article, sidecar))
+    if not jobs:
+        return
+
+    context = _fork_context()
+    if context is None:
+        logger.warning('`pelican-cite` cannot fork worker processes here; '
+                       'processing citations serially')
+    if context is None or len(jobs) < 2:
+        for article, sidecar in jobs:
+            result = cite_content(article._content, indexes[sidecar],
+                                  sidecars.url(sidecar))
+            if result is not None:
+                apply_citations(article, sidecar, *result)
+        return
+
+    # Load the fragment store before forking so workers start from it.
+    fragments.ensure_loaded()
+    payload = pickle.dumps(indexes, protocol=pickle.HIGHEST_PROTOCOL)
+    workers = min(size, len(jobs))
+    chunksize = max(1, len(jobs) // (workers * 4))
+    work = [(article._content, sidecar, sidecars.url(sidecar))
+            for article, sidecar in jobs]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(payload,)) as executor:
+        results = executor.map(_run_job, work, chunksize=chunksize)
+        for (article, sidecar), result in zip(jobs, results):
+            if result is not None:
+                apply_citations(article, sidecar, *result)
+    logger.debug('`pelican-cite` processed %d article(s) with %d worker(s)',
+                 len(jobs), workers)
@@ -0,0 +1,147 @@
+"""
+Bluesky avatar resolver for pelican-collaborators.
+
+Avatar URLs are looked up in Bluesky's public API and remembered in a JSON
+file under the cache directory, so rebuilds do not ask again for handles
+they already know. Entries expire after ``BLUESKY_AVATAR_TTL`` days; handles
+without an avatar (or unknown to Bluesky) are remembered as such, for the
+shorter ``BLUESKY_AVATAR_NEGATIVE_TTL``. When a lookup fails on the network,
+a previously known avatar is kept.
+
+All handles a build needs are prefetched together on a small thread pool
+before the collaborators are processed, so the build waits for at most one
+round of lookups rather than one per handle. With ``BLUESKY_AVATAR_OFFLINE``
+the network is never used and cached avatars are used however old they are.
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+try:
+    import requests
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+    logger.warning('pelican-collaborators: requests not available, Bluesky avatars disabled')
+
+PROFILE_API = 'https://public.api.bsky.app/xrpc/app.bsky.actor.getProfile'
+TIMEOUT = 5
+WORKERS = 8
+
+DAY = 24 * 60 * 60
+
+
+class AvatarResolver(object):
+    """
+    Resolves Bluesky handles to avatar URLs through a persistent cache.
+
+    The cache maps each handle to ``{"avatar": url or null, "fetched_at":
+    unix time}``.
+    """
+
+    def __init__(self, cache_file=None, ttl=7, negative_ttl=1, offline=False):
+        self.cache_file = cache_file
+        self.ttl = ttl * DAY
+        self.negative_ttl = negative_ttl * DAY
+        self.offline = offline or not REQUESTS_AVAILABLE
+        self.entries = self._load()
+        self.dirty = False
+        # Handles looked up (successfully or not) by this resolver
+        self.attempted = set()
+
+    @classmethod
+    def from_settings(cls, settings):
+        default = os.path.join(settings.get('CACHE_PATH', 'cache'),
+                               'collaborators', 'bluesky-avatars.json')
+        return cls(cache_file=settings.get('BLUESKY_AVATAR_CACHE', default),
+                   ttl=settings.get('BLUESKY_AVATAR_TTL', 7),
+                   negative_ttl=settings.get('BLUESKY_AVATAR_NEGATIVE_TTL', 1),
+                   offline=settings.get('BLUESKY_AVATAR_OFFLINE', False))
+
+    def _load(self):
+        if not self.cache_file:
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.debug(f'pelican-collaborators: ignoring unreadable avatar cache: {e}')
+            return {}
+
+    def save(self):
+        """Write the cache back if it changed."""
+        if not self.cache_file or not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            with open(self.cache_file + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(self.cache_file + '.tmp', self.cache_file)
+            self.dirty = False
+        except OSError as e:
+            logger.debug(f'pelican-collaborators: could not write avatar cache: {e}')
+
+    def is_fresh(self, handle, now=None):
+        entry = self.entries.get(handle)
+        if entry is None:
+            return False
+        if self.offline:
+            return True
+        ttl = self.ttl if entry.get('avatar') else self.negative_ttl
+        return (now or time.time()) - entry.get('fetched_at', 0) < ttl
+
+    def fetch(self, handle):
+        """
+        Ask the Bluesky API for ``handle``'s avatar. Returns the avatar URL,
+        None if the profile has none or does not exist, and raises on
+        network errors.
+        """
+        response = requests.get(PROFILE_API, params={'actor': handle}, timeout=TIMEOUT)
+        if response.status_code == 200:
+            return response.json().get('avatar')
+        if response.status_code >= 500 or response.status_code == 429:
+            raise IOError(f'Bluesky API returned {response.status_code}')
+        logger.debug(f'pelican-collaborators: Bluesky API returned {response.status_code} for {handle}')
+        return None
+
+    def _refresh(self, handle):
+        try:
+            return handle, self.fetch(handle), None
+        except Exception as e:
+            return handle, None, e
+
+    def prefetch(self, handles):
+        """
+        Look up every handle in ``handles`` without a fresh cache entry,
+        concurrently. Each handle is tried at most once per resolver.
+        """
+        now = time.time()
+        stale = sorted(set(h for h in handles if h and h not in self.attempted
+                           and not self.is_fresh(h, now)))
+        if not stale or self.offline:
+            return
+        self.attempted.update(stale)
+        with ThreadPoolExecutor(max_workers=min(WORKERS, len(stale))) as executor:
+            for handle, avatar, error in executor.map(self._refresh, stale):
+                if error is not None:
+                    # Keep what we knew; try again next build
+                    logger.debug(f'pelican-collaborators: failed to fetch Bluesky avatar for {handle}: {error}')
+                    continue
+                self.entries[handle] = {'avatar': avatar, 'fetched_at': now}
+                self.dirty = True
+        logger.info(f'pelican-collaborators: looked up {len(stale)} Bluesky avatar(s)')
+        self.save()
+
+    def get(self, handle):
+        """Return the avatar URL of ``handle`` or None, fetching it if it was not prefetched."""
+        if not self.is_fresh(handle):
+            self.prefetch([handle])
+        entry = self.entries.get(handle)
+        return entry.get('avatar') if entry else None
@@ -6,6 +6,13 @@ Generates a collaborators/team page with photos organized by category.
 
 Configuration:
     COLLABORATORS_SRC: Path to YAML file with collaborator definitions
+    COLLABORATORS_PHOTO_MANIFEST: Thumbnail manifest written by
+        scripts/fetch-collaborator-photos.py (default: content/collaborator-photos.json)
+    BLUESKY_AVATAR_CACHE: JSON file caching Bluesky avatar URLs between builds
+        (default: CACHE_PATH/collaborators/bluesky-avatars.json, None disables)
+    BLUESKY_AVATAR_TTL: Days before a cached avatar is looked up again (default: 7)
+    BLUESKY_AVATAR_NEGATIVE_TTL: Days before a handle without avatar is tried again (default: 1)
+    BLUESKY_AVATAR_OFFLINE: Never use the network, only the cache (default: False)
 
 YAML format:
     settings:
@@ -42,69 +49,90 @@ YAML format:
         bio: "Brief bio..."
 """
 
+import importlib.util
 import logging
 import os
 import json
 
 from pelican import signals
 
-logger = logging.getLogger(__name__)
+import pelican_data
+
+from .avatars import AvatarResolver
 
-# Try to import requests for Bluesky API calls
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-except ImportError:
-    REQUESTS_AVAILABLE = False
-    logger.warning('pelican-collaborators: requests not available, Bluesky avatars disabled')
+logger = logging.getLogger(__name__)
 
-# Simple cache for Bluesky avatars to avoid repeated API calls
-_bluesky_avatar_cache = {}
+# The Bluesky avatar resolver of the current build
+_avatars = None
 
 
 def get_bluesky_avatar(handle):
     """Fetch avatar URL from Bluesky public API.
 
+    Lookups are cached on disk and usually prefetched for the whole build,
+    see ``avatars.AvatarResolver``.
+
     Args:
         handle: Bluesky handle (e.g., 'alice.bsky.social' or 'alice.com')
 
     Returns:
         Avatar URL string or None if not available
     """
-    if not REQUESTS_AVAILABLE:
-        return None
+    global _avatars
+    if _avatars is None:
+        _avatars = AvatarResolver()
+    return _avatars.get(handle)
 
-    # Check cache first
-    if handle in _bluesky_avatar_cache:
-        return _bluesky_avatar_cache[handle]
 
+# PyYAML itself is imported by pelican_data.load_yaml
+YAML_AVAILABLE = importlib.util.find_spec('yaml') is not None
+if not YAML_AVAILABLE:
+    logger.warning('pelican-collaborators: PyYAML not available')
+
+
+def photo_source(person):
+    """
+    Identify where a person's photo comes from: the explicit ``photo``, else
+    ``github:<user>`` or ``bluesky:<handle>``. Matches the photo_source() of
+    scripts/fetch-collaborator-photos.py, which records it in the manifest.
+    """
+    links = person.get('links') or {}
+    if person.get('photo'):
+        return person['photo']
+    if links.get('github'):
+        return f"github:{links['github']}"
+    if links.get('bluesky'):
+        return f"bluesky:{links['bluesky']}"
+    return None
+
+
+def load_photo_manifest(manifest_path):
+    """Return the thumbnails of each person by name, or {} if there are none."""
+    if not os.path.exists(manifest_path):
+        return {}
     try:
-        url = f'https://public.api.bsky.app/xrpc/app.bsky.actor.getProfile?actor={handle}'
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            avatar_url = data.get('avatar')
-            _bluesky_avatar_cache[handle] = avatar_url
-            return avatar_url
-        else:
-            logger.debug(f'pelican-collaborators: Bluesky API returned {response.status_code} for {handle}')
-            _bluesky_avatar_cache[handle] = None
-            return None
-    except Exception as e:
-        logger.debug(f'pelican-collaborators: failed to fetch Bluesky avatar for {handle}: {e}')
-        _bluesky_avatar_cache[handle] = None
-        return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f'pelican-collaborators: failed to load {manifest_path}: {e}')
+        return {}
 
 
-try:
-    import yaml
-    YAML_AVAILABLE = True
-except ImportError:
-    YAML_AVAILABLE = False
-    logger.warning('pelican-collaborators: PyYAML not available')
+def use_local_photo(person, photos):
+    """
+    Point ``person``'s photo to its local thumbnails, if the manifest has
+    thumbnails made from the photo the YAML currently gives.
+    """
+    entry = photos.get(person.get('name'))
+    if not entry or entry.get('source') != photo_source(person):
+        return False
+    person['photo'] = entry['src']
+    person['photo_srcset'] = entry['srcset']
+    person['photo_webp_srcset'] = entry['webp_srcset']
+    return True
 
 
-def add_collaborators(generator):
+def build_collaborators(generator):
     """Add collaborators data to the generator context."""
     if not YAML_AVAILABLE:
         return
@@ -113,11 +141,11 @@ def add_collaborators(generator):
     if not yaml_path:
         return
 
-    # Resolve path relative to project root (not content directory)
+    # Resolve paths relative to project root (not content directory)
+    # Get the base path (parent of content directory)
+    content_path = generator.settings.get('PATH', 'content')
+    base_path = os.path.dirname(content_path) if content_path != 'content' else '.'
     if not os.path.isabs(yaml_path):
-        # Get the base path (parent of content directory)
-        content_path = generator.settings.get('PATH', 'content')
-        base_path = os.path.dirname(content_path) if content_path != 'content' else '.'
         yaml_path = os.path.join(base_path, yaml_path)
 
     if not os.path.exists(yaml_path):
@@ -126,8 +154,7 @@ def add_collaborators(generator):
 
     # Load YAML
     try:
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
+        data = pelican_data.load_yaml(yaml_path)
     except Exception as e:
         logger.error(f'pelican-collaborators: failed to parse {yaml_path}: {e}')
         return
@@ -143,16 +170,35 @@ def add_collaborators(generator):
 
     # Process people
     people = data.get('people', [])
+
+    # Serve local thumbnails where scripts/fetch-collaborator-photos.py made them
+    manifest_path = generator.settings.get('COLLABORATORS_PHOTO_MANIFEST', 'content/collaborator-photos.json')
+    if not os.path.isabs(manifest_path):
+        manifest_path = os.path.join(base_path, manifest_path)
+    photos = load_photo_manifest(manifest_path)
+    local_photos = sum(1 for person in people if use_local_photo(person, photos))
+    if photos and local_photos < len(people):
+        logger.debug(f'pelican-collaborators: {len(people) - local_photos} collaborators without '
+                     f'up-to-date thumbnails, run scripts/fetch-collaborator-photos.py')
+
+    # Look up all the Bluesky avatars needed below at once
+    global _avatars
+    _avatars = AvatarResolver.from_settings(generator.settings)
+    _avatars.prefetch([(person.get('links') or {}).get('bluesky') for person in people
+                       if not person.get('photo') and not (person.get('links') or {}).get('github')])
+
     for person in people:
         # Apply default image shape if not specified
         if 'image_shape' not in person:
             person['image_shape'] = default_image_shape
 
-        # Ensure lists exist
-        if 'publications' not in person:
-            person['publications'] = []
-        if 'projects' not in person:
-            person['projects'] = []
+        # Ensure lists exist (a single key or slug may be given as a string)
+        for field in ('publications', 'projects'):
+            value = person.get(field)
+            if not value:
+                person[field] = []
+            elif isinstance(value, str):
+                person[field] = [value]
         if 'links' not in person:
             person['links'] = {}
 
@@ -173,19 +219,25 @@ def add_collaborators(generator):
                 if avatar_url:
                     person['photo'] = avatar_url
 
-    # Group people by category
+    # Group people by category, in one pass over people
+    people_by_category_id = {cat['id']: [] for cat in categories_data}
+    for person in people:
+        bucket = people_by_category_id.get(person.get('category'))
+        if bucket is not None:
+            bucket.append(person)
+
+    # Sort by: current first, then end_year desc, then start_year desc, then name
+    def sort_key(p):
+        is_current = p.get('current', False)
+        end_year = p.get('end_year') or 9999
+        start_year = p.get('start_year') or 0
+        # Current people first (0 sorts before 1), then by end_year desc, start_year desc
+        return (0 if is_current else 1, -end_year, -start_year, p.get('name', ''))
+
     people_by_category = []
     for cat_data in categories_data:
         cat_id = cat_data['id']
-        cat_people = [p for p in people if p.get('category') == cat_id]
-
-        # Sort by: current first, then end_year desc, then start_year desc, then name
-        def sort_key(p):
-            is_current = p.get('current', False)
-            end_year = p.get('end_year') or 9999
-            start_year = p.get('start_year') or 0
-            # Current people first (0 sorts before 1), then by end_year desc, start_year desc
-            return (0 if is_current else 1, -end_year, -start_year, p.get('name', ''))
+        cat_people = people_by_category_id[cat_id]
         cat_people.sort(key=sort_key)
 
         people_by_category.append({
@@ -195,6 +247,16 @@ def add_collaborators(generator):
             'people': cat_people,
         })
 
+    # Index people by the publications and projects they list; the
+    # publication and project records are linked in once all plugins ran
+    people_by_publication = {}
+    people_by_project = {}
+    for person in people:
+        for key in person['publications']:
+            people_by_publication.setdefault(key, []).append(person)
+        for slug in person['projects']:
+            people_by_project.setdefault(slug, []).append(person)
+
     # Add to context
     generator.context['collaborators'] = {
         'settings': {
@@ -203,11 +265,53 @@ def add_collaborators(generator):
         },
         'categories': people_by_category,
         'all_people': people,
+        'people_by_publication': people_by_publication,
+        'people_by_project': people_by_project,
+        'publications_by_person': {},
     }
 
     logger.info(f'pelican-collaborators: loaded {len(people)} collaborators in {len(categories)} categories')
 
 
+def link_collaborators(generators):
+    """
+    Resolve each person's publication keys and project slugs to the records
+    of pelican-selected-publications and pelican-projects.
+
+    Runs once all generators are done, whatever the order of the plugins.
+    Sets ``person['publication_entries']`` and ``person['project_entries']``,
+    fills the ``publications_by_person`` index and gives every project and
+    publication record the ``people`` listing it.
+    """
+    if not generators:
+        return
+    context = generators[0].context
+    collaborators = context.get('collaborators')
+    if not collaborators:
+        return
+
+    selected = context.get('selected_publications') or {}
+    publications = {pub['key']: pub for pub in selected.get('all_publications', [])}
+    # Draft projects get their people too, but are not listed for a person
+    all_projects = (context.get('projects_draft') or {}).get('all_projects', [])
+    published = (context.get('projects') or {}).get('all_projects', [])
+    projects = {project['slug']: project for project in published}
+
+    publications_by_person = collaborators['publications_by_person']
+    for person in collaborators['all_people']:
+        person['publication_entries'] = [publications[key] for key in person['publications']
+                                         if key in publications]
+        person['project_entries'] = [projects[slug] for slug in person['projects']
+                                     if slug in projects]
+        publications_by_person[person.get('name', '')] = person['publication_entries']
+
+    for key, pub in publications.items():
+        pub['people'] = collaborators['people_by_publication'].get(key, [])
+    for project in all_projects or published:
+        project['people'] = collaborators['people_by_project'].get(project['slug'], [])
+
+
 def register():
     """Register the plugin with Pelican."""
-    signals.generator_init.connect(add_collaborators)
+    pelican_data.register_builder('pelican-collaborators', build_collaborators)
+    signals.all_generators_finalized.connect(link_collaborators)
@@ -37,19 +37,18 @@ YAML format:
           src: "url"  # for audio/image
 """
 
+import importlib.util
 import logging
 import os
 from datetime import datetime, date
 
-from pelican import signals
+import pelican_data
 
 logger = logging.getLogger(__name__)
 
-try:
-    import yaml
-    YAML_AVAILABLE = True
-except ImportError:
-    YAML_AVAILABLE = False
+# PyYAML itself is imported by pelican_data.load_yaml
+YAML_AVAILABLE = importlib.util.find_spec('yaml') is not None
+if not YAML_AVAILABLE:
     logger.warning('pelican-media: PyYAML not available')
 
 
@@ -82,7 +81,7 @@ def parse_date(date_val):
     return None
 
 
-def add_media(generator):
+def build_media(generator):
     """Add media data to the generator context."""
     if not YAML_AVAILABLE:
         return
@@ -103,8 +102,7 @@ def add_media(generator):
 
     # Load YAML
     try:
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
+        data = pelican_data.load_yaml(yaml_path)
     except Exception as e:
         logger.error(f'pelican-media: failed to parse {yaml_path}: {e}')
         return
@@ -188,4 +186,4 @@ def add_media(generator):
 
 def register():
     """Register the plugin with Pelican."""
-    signals.generator_init.connect(add_media)
+    pelican_data.register_builder('pelican-media', build_media)
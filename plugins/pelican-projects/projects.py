@@ -34,18 +34,17 @@ YAML format:
         collaborators: ["Person Name"]
 """
 
+import importlib.util
 import logging
 import os
 
-from pelican import signals
+import pelican_data
 
 logger = logging.getLogger(__name__)
 
-try:
-    import yaml
-    YAML_AVAILABLE = True
-except ImportError:
-    YAML_AVAILABLE = False
+# PyYAML itself is imported by pelican_data.load_yaml
+YAML_AVAILABLE = importlib.util.find_spec('yaml') is not None
+if not YAML_AVAILABLE:
     logger.warning('pelican-projects: PyYAML not available')
 
 
@@ -63,7 +62,7 @@ def get_github_social_image(repo):
     return f'https://opengraph.githubassets.com/1/{repo}'
 
 
-def add_projects(generator):
+def build_projects(generator):
     """Add projects data to the generator context."""
     if not YAML_AVAILABLE:
         return
@@ -84,8 +83,7 @@ def add_projects(generator):
 
     # Load YAML
     try:
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
+        data = pelican_data.load_yaml(yaml_path)
     except Exception as e:
         logger.error(f'pelican-projects: failed to parse {yaml_path}: {e}')
         return
@@ -179,4 +177,4 @@ def add_projects(generator):
 
 def register():
     """Register the plugin with Pelican."""
-    signals.generator_init.connect(add_projects)
+    pelican_data.register_builder('pelican-projects', build_projects)
@@ -24,12 +24,12 @@ Citation data (optional):
     Data is stored in content/citations.json and used for sorting.
 """
 
+import importlib.util
 import json
 import logging
 import os
-import re
 
-from pelican import signals
+import pelican_data
 
 logger = logging.getLogger(__name__)
 
@@ -45,71 +45,110 @@ except ImportError:
     PYBTEX_AVAILABLE = False
     logger.warning('pelican-selected-publications: pybtex not available')
 
-try:
-    import yaml
-    YAML_AVAILABLE = True
-except ImportError:
-    YAML_AVAILABLE = False
+# PyYAML itself is imported by pelican_data.load_yaml
+YAML_AVAILABLE = importlib.util.find_spec('yaml') is not None
+if not YAML_AVAILABLE:
     logger.warning('pelican-selected-publications: PyYAML not available')
 
 
-def format_publication(entry, key, plain_style, html_backend):
-    """Format a single BibTeX entry to HTML."""
-    # Workaround for entries missing certain fields
-    if 'journal' not in entry.fields:
-        entry.fields['journal'] = ''
-    if 'booktitle' not in entry.fields:
-        entry.fields['booktitle'] = ''
-
-    # Format using pybtex
-    bibdata = BibliographyData(entries={key: entry})
-    formatted = list(plain_style.format_entries(bibdata.entries.values()))[0]
-    text = formatted.text.render(html_backend)
-
-    # Clean up formatting artifacts
-    text = text.replace('\\{', '&#123;')
-    text = text.replace('\\}', '&#125;')
-    text = text.replace('{', '')
-    text = text.replace('}', '')
-
-    # Replace the title's bibtex-protected span with pub-title class
-    # Get the title from the entry and find its span
-    title = entry.fields.get('title', '')
-    # Clean title for matching (remove braces)
-    clean_title = title.replace('{', '').replace('}', '')
-    if clean_title:
-        # Escape special regex characters in title
-        escaped_title = re.escape(clean_title)
-        # Replace the span containing the title with pub-title class
-        pattern = r'<span class="bibtex-protected">' + escaped_title + r'</span>'
-        replacement = r'<span class="pub-title">' + clean_title + r'</span>'
-        text = re.sub(pattern, replacement, text, count=1)
-
-    # Generate BibTeX string
+TITLE_SPAN = '<span class="bibtex-protected">{0}</span>'
+PUB_TITLE_SPAN = '<span class="pub-title">{0}</span>'
+
+
+def format_entries(entries):
+    """
+    Format BibTeX entries to HTML and BibTeX locally, for sites without the
+    shared bibliography service.
+
+    ``entries`` maps keys to entries. All entries are formatted by a single
+    ``format_entries`` call and serialized back to BibTeX through a single
+    writer and buffer. Returns a dict mapping each key to ``(text, bibtex)``.
+    """
+    for entry in entries.values():
+        # Workaround for entries missing certain fields
+        if 'journal' not in entry.fields:
+            entry.fields['journal'] = ''
+        if 'booktitle' not in entry.fields:
+            entry.fields['booktitle'] = ''
+
+    # Format using pybtex (entries come back in the style's sort order)
+    plain_style = plain.Style()
+    html_backend = html.Backend()
+    texts = {}
+    for formatted in plain_style.format_entries(entries.values()):
+        texts[formatted.key] = formatted.text.render(html_backend)
+
+    # Generate BibTeX strings, one stretch of the shared buffer per entry
+    writer = Writer()
     bib_buf = StringIO()
-    Writer().write_stream(bibdata, bib_buf)
-    bibtex = bib_buf.getvalue()
-
-    # Extract useful fields
-    year = entry.fields.get('year', '')
-    doi = entry.fields.get('doi', '')
-    eprint = entry.fields.get('eprint', '')
-    url = entry.fields.get('url', '')
-    pdf = entry.fields.get('pdf', '')
-
-    return {
-        'key': key,
-        'text': text,
-        'bibtex': bibtex,
-        'year': year,
-        'doi': doi,
-        'eprint': eprint,
-        'url': url,
-        'pdf': pdf,
-    }
+    bibtex_spans = {}
+    for key, entry in entries.items():
+        start = bib_buf.tell()
+        writer.write_stream(BibliographyData(entries={key: entry}), bib_buf)
+        bibtex_spans[key] = (start, bib_buf.tell())
+    bibtex_all = bib_buf.getvalue()
+
+    return {key: (texts[entry.key], bibtex_all[slice(*bibtex_spans[key])])
+            for key, entry in entries.items()}
 
 
-def add_selected_publications(generator):
+def format_publications(entries, formatted):
+    """
+    Build the publication dicts of the ``formatted`` entries.
+
+    ``entries`` maps keys to BibTeX entries and ``formatted`` maps the keys
+    to format to their ``(text, bibtex)``, as returned by the shared
+    bibliography service or by ``format_entries``. Returns a dict mapping
+    each key to its publication.
+    """
+    publications = {}
+    for key, (text, bibtex) in formatted.items():
+        entry = entries[key]
+
+        # Clean up formatting artifacts
+        text = text.replace('\\{', '&#123;')
+        text = text.replace('\\}', '&#125;')
+        text = text.replace('{', '')
+        text = text.replace('}', '')
+
+        # Replace the title's bibtex-protected span with pub-title class
+        clean_title = entry.fields.get('title', '').replace('{', '').replace('}', '')
+        if clean_title:
+            text = text.replace(TITLE_SPAN.format(clean_title),
+                                PUB_TITLE_SPAN.format(clean_title), 1)
+
+        publications[key] = {
+            'key': key,
+            'text': text,
+            'bibtex': bibtex,
+            'year': entry.fields.get('year', ''),
+            'doi': entry.fields.get('doi', ''),
+            'eprint': entry.fields.get('eprint', ''),
+            'url': entry.fields.get('url', ''),
+            'pdf': entry.fields.get('pdf', ''),
+        }
+    return publications
+
+
+def publication_records_json(publications):
+    """
+    Serialize the publications as a JSON object keyed by BibTeX key, in list
+    order, for embedding once per page in a ``<script>`` data island.
+    """
+    records = {}
+    for pub in publications:
+        records[pub['key']] = {
+            'bibtex': pub['bibtex'],
+            'year': pub['year'],
+            'citations': pub['citations'],
+            'category_id': pub['category_id'],
+        }
+    data = json.dumps(records, ensure_ascii=False, separators=(',', ':'))
+    # Never let the data close the surrounding script element
+    return data.replace('</', '<\\/')
+
+
+def build_selected_publications(generator):
     """
     Populates context with selected publications organized by category.
 
@@ -122,9 +161,13 @@ def add_selected_publications(generator):
                 - publications: list of formatted publication dicts
             - highlights: set of keys marked as highlights
     """
-    if not PYBTEX_AVAILABLE:
-        logger.warning('pelican-selected-publications: pybtex required')
-        return
+    try:
+        import pelican_bibliography
+    except ImportError:
+        pelican_bibliography = None
+        if not PYBTEX_AVAILABLE:
+            logger.warning('pelican-selected-publications: pybtex required')
+            return
 
     if not YAML_AVAILABLE:
         logger.warning('pelican-selected-publications: PyYAML required')
@@ -136,8 +179,7 @@ def add_selected_publications(generator):
 
     # Load YAML configuration
     try:
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+        config = pelican_data.load_yaml(yaml_path)
     except Exception as e:
         logger.error(f'pelican-selected-publications: failed to load {yaml_path}: {e}')
         return
@@ -147,9 +189,12 @@ def add_selected_publications(generator):
     if not os.path.isabs(bibtex_file):
         bibtex_file = os.path.join(os.path.dirname(yaml_path), bibtex_file)
 
-    # Parse BibTeX
+    # Parse BibTeX (shared with the other bibliography plugins, if enabled)
     try:
-        bibdata = Parser().parse_file(bibtex_file)
+        if pelican_bibliography is not None:
+            bib = pelican_bibliography.get(bibtex_file)
+        else:
+            bib = Parser().parse_file(bibtex_file).entries
     except Exception as e:
         logger.error(f'pelican-selected-publications: failed to parse {bibtex_file}: {e}')
         return
@@ -165,15 +210,40 @@ def add_selected_publications(generator):
         except Exception as e:
             logger.warning(f'pelican-selected-publications: failed to load citations: {e}')
 
-    # Initialize pybtex formatting
-    plain_style = plain.Style()
-    html_backend = html.Backend()
-
     # Get highlights set
     highlights = set(config.get('highlights', []))
 
+    # Format every selected publication once, in a single batch
+    selected = {}
+    for cat_config in config.get('categories', []):
+        for key in cat_config.get('publications', []):
+            if key in bib:
+                selected[key] = True
+    if pelican_bibliography is not None:
+        formatted = bib.format(list(selected))
+    else:
+        formatted = format_entries({key: bib[key] for key in selected})
+    formatted = format_publications(bib, formatted)
+
+    # Build each publication once; categories share the same dicts
+    for key, pub in formatted.items():
+        pub['highlight'] = key in highlights
+        # Add citation data if available
+        if key in citations:
+            pub['citations'] = citations[key].get('cited_by_count', 0)
+            # Use OpenAlex ID if available, otherwise Semantic Scholar
+            pub['citation_url'] = (
+                citations[key].get('openalex_id', '') or
+                citations[key].get('semantic_scholar_id', '')
+            )
+        else:
+            pub['citations'] = 0
+            pub['citation_url'] = ''
+
     # Process categories
     categories = []
+    all_publications = []
+    seen_keys = set()
     for cat_config in config.get('categories', []):
         cat_id = cat_config.get('id', '')
         cat_title = cat_config.get('title', '')
@@ -182,24 +252,17 @@ def add_selected_publications(generator):
 
         publications = []
         for key in pub_keys:
-            if key not in bibdata.entries:
+            if key not in formatted:
                 logger.warning(f'pelican-selected-publications: key "{key}" not found in BibTeX')
                 continue
 
-            entry = bibdata.entries[key]
-            pub = format_publication(entry, key, plain_style, html_backend)
-            pub['highlight'] = key in highlights
-            # Add citation data if available
-            if key in citations:
-                pub['citations'] = citations[key].get('cited_by_count', 0)
-                # Use OpenAlex ID if available, otherwise Semantic Scholar
-                pub['citation_url'] = (
-                    citations[key].get('openalex_id', '') or
-                    citations[key].get('semantic_scholar_id', '')
-                )
-            else:
-                pub['citations'] = 0
-                pub['citation_url'] = ''
+            pub = formatted[key]
+            if key not in seen_keys:
+                # A publication's first category is the one used in the flat list
+                pub['category'] = cat_title
+                pub['category_id'] = cat_id
+                all_publications.append(pub)
+                seen_keys.add(key)
             publications.append(pub)
 
         categories.append({
@@ -209,27 +272,16 @@ def add_selected_publications(generator):
             'publications': publications,
         })
 
-    # Create flat list of all publications (for sorting)
-    all_publications = []
-    seen_keys = set()
-    for cat in categories:
-        for pub in cat['publications']:
-            if pub['key'] not in seen_keys:
-                pub_copy = pub.copy()
-                pub_copy['category'] = cat['title']
-                pub_copy['category_id'] = cat['id']
-                all_publications.append(pub_copy)
-                seen_keys.add(pub['key'])
-
     # Add to context
     generator.context['selected_publications'] = {
         'categories': categories,
         'highlights': highlights,
         'all_publications': all_publications,
+        'records_json': publication_records_json(all_publications),
     }
 
     logger.info(f'pelican-selected-publications: loaded {len(all_publications)} publications in {len(categories)} categories')
 
 
 def register():
-    signals.generator_init.connect(add_selected_publications)
+    pelican_data.register_builder('pelican-selected-publications', build_selected_publications)
@@ -0,0 +1,5 @@
+"""Pelican Bibliography Service - shared BibTeX parsing and formatting."""
+
+from .bibliography import Bibliography, FormattedEntry, get, register
+
+__all__ = ['Bibliography', 'FormattedEntry', 'get', 'register']
@@ -0,0 +1,216 @@
+"""
+Pelican Bibliography Service
+============================
+
+Shared BibTeX parsing and formatting for the plugins of this site.
+
+Several plugins read the same ``.bib`` files under ``content/``. Instead of
+each parsing and formatting them on its own, they ask this service for a
+``Bibliography``: a read-only view of one parsed file. Each file is parsed
+once per build (and not at all when it is unchanged since the last build,
+thanks to an on-disk cache keyed by its contents, kept with
+``pelican_data``'s ``PickleCache``), and the plain-style HTML
+and BibTeX of each entry are formatted once and shared by every plugin that
+asks for them.
+
+Requires the ``pelican_data`` plugin, listed before this one.
+
+Configuration:
+    BIBLIOGRAPHY_CACHE_PATH: Directory for the parse cache. Defaults to
+        ``CACHE_PATH/bibliography``; ``None`` keeps the cache in memory.
+
+Usage from another plugin (inside a signal handler, once all plugins have
+been loaded):
+
+    import pelican_bibliography
+    bib = pelican_bibliography.get('content/pubs.bib')
+    entry = bib['Key:2020abc']
+    text, bibtex = bib.format(['Key:2020abc'])['Key:2020abc']
+"""
+
+import logging
+import os
+import types
+from collections import namedtuple
+from io import StringIO
+
+from pelican import signals
+
+import pelican_data
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the pickled payload changes.
+CACHE_VERSION = 2
+
+FormattedEntry = namedtuple('FormattedEntry', ['text', 'bibtex'])
+
+_cache = pelican_data.PickleCache('pelican-bibliography', CACHE_VERSION)
+_bibliographies = {}
+_style = None
+
+
+class Bibliography(object):
+    """
+    Read-only view of one parsed BibTeX file.
+
+    Behaves as a mapping from (case-insensitive) keys to pybtex entries.
+    The entries are shared by every plugin and must not be modified; use
+    ``format`` for formatted text rather than patching fields.
+    """
+
+    __slots__ = ('path', 'digest', '_data', '_formatted')
+
+    def __init__(self, path, digest, data):
+        self.path = path
+        self.digest = digest
+        self._data = data
+        self._formatted = {}
+
+    @property
+    def data(self):
+        """The shared ``BibliographyData``, for APIs that need one."""
+        return self._data
+
+    @property
+    def entries(self):
+        return types.MappingProxyType(self._data.entries)
+
+    def __getitem__(self, key):
+        return self._data.entries[key]
+
+    def __contains__(self, key):
+        return key in self._data.entries
+
+    def __iter__(self):
+        return iter(self._data.entries)
+
+    def __len__(self):
+        return len(self._data.entries)
+
+    def keys(self):
+        return self._data.entries.keys()
+
+    def sorted_keys(self, keys=None):
+        """
+        Return ``keys`` (all keys by default) in the order of the plain
+        style's sorting, as used for formatted lists.
+        """
+        if keys is None:
+            keys = list(self._data.entries.keys())
+        by_key = {self._data.entries[key].key: key for key in keys}
+        entries = [self._data.entries[key] for key in by_key.values()]
+        return [by_key[entry.key] for entry in _get_style()[0].sort(entries)]
+
+    def format(self, keys=None):
+        """
+        Return a dict mapping each of ``keys`` (all keys by default) to a
+        ``FormattedEntry`` with the plain-style HTML and the BibTeX source of
+        the entry. Entries not formatted before are formatted together, in a
+        single batch.
+        """
+        if keys is None:
+            keys = list(self._data.entries.keys())
+        missing = {}
+        for key in keys:
+            entry = self._data.entries[key]
+            if entry.key not in self._formatted:
+                missing[entry.key] = entry
+        if missing:
+            self._formatted.update(_format_entries(missing))
+        return {key: self._formatted[self._data.entries[key].key] for key in keys}
+
+
+def _plain_copy(entry):
+    """
+    Return a copy of ``entry`` that the plain style can format: entries
+    without journal or booktitle break some of its templates.
+    """
+    from pybtex.database import Entry
+
+    fields = dict(entry.fields)
+    if 'journal' not in fields:
+        fields['journal'] = ''
+    if 'booktitle' not in fields:
+        fields['booktitle'] = ''
+    copy = Entry(entry.original_type, fields=fields, persons=entry.persons)
+    copy.key = entry.key
+    return copy
+
+
+def _get_style():
+    """Return the shared plain style and HTML backend, creating them once."""
+    global _style
+    if _style is None:
+        from pybtex.backends import html
+        from pybtex.style.formatting import plain
+
+        _style = (plain.Style(), html.Backend())
+    return _style
+
+
+def _format_entries(entries):
+    """Format ``entries`` (a dict of key to entry) in one batch."""
+    from pybtex.database import BibliographyData
+    from pybtex.database.output.bibtex import Writer
+
+    plain_style, html_backend = _get_style()
+
+    texts = {}
+    copies = [_plain_copy(entry) for entry in entries.values()]
+    for formatted in plain_style.format_entries(copies):
+        texts[formatted.key] = formatted.text.render(html_backend)
+
+    # One writer and one buffer for all entries, sliced by offsets
+    writer = Writer()
+    bib_buf = StringIO()
+    spans = {}
+    for key, entry in entries.items():
+        start = bib_buf.tell()
+        writer.write_stream(BibliographyData(entries={key: entry}), bib_buf)
+        spans[key] = (start, bib_buf.tell())
+    bibtex_all = bib_buf.getvalue()
+
+    return {key: FormattedEntry(texts[key], bibtex_all[slice(*spans[key])])
+            for key in entries}
+
+
+def get(bib_file):
+    """
+    Return the ``Bibliography`` for ``bib_file``, parsing it only if it has
+    not been parsed with its current contents before.
+
+    Parse errors are raised exactly as pybtex raises them (``PybtexError``).
+    """
+    from pybtex.database.input.bibtex import Parser
+
+    path = os.path.abspath(bib_file)
+    try:
+        digest = pelican_data.file_digest(path)
+    except OSError:
+        # Let pybtex report the missing/unreadable file as a PybtexError
+        Parser().parse_file(path)
+        raise
+    bib = _bibliographies.get(path)
+    if bib is not None and bib.digest == digest:
+        return bib
+
+    data = _cache.load(path, check=digest)
+    if data is None:
+        data = Parser().parse_file(path)
+        _cache.save(path, data, check=digest)
+    else:
+        logger.debug(f'pelican-bibliography: loaded {bib_file} from cache')
+    bib = _bibliographies[path] = Bibliography(path, digest, data)
+    return bib
+
+
+def configure(pelican_obj):
+    """Read the cache location from the settings."""
+    settings = pelican_obj.settings
+    default = os.path.join(settings.get('CACHE_PATH', 'cache'), 'bibliography')
+    _cache.directory = settings.get('BIBLIOGRAPHY_CACHE_PATH', default)
+
+
+def register():
+    signals.initialized.connect(configure)
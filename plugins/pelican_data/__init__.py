@@ -0,0 +1,14 @@
+"""Pelican Data Service - shared YAML loading, pickle cache and build-once plugin data."""
+
+from pelican import signals
+
+from .filecache import PickleCache, file_digest
+from .registry import register_builder, report
+from .yamldata import configure, load_yaml
+
+__all__ = ['PickleCache', 'file_digest', 'load_yaml', 'register', 'register_builder']
+
+
+def register():
+    signals.initialized.connect(configure)
+    signals.finalized.connect(report)
@@ -0,0 +1,94 @@
+"""
+Shared pickle cache for the plugins of this site.
+
+Several plugins keep data derived from source files between builds: parsed
+YAML and BibTeX files, formatted bibliography entries. A ``PickleCache``
+stores each item as one pickle file in its directory, with the cache's
+format version and an optional ``check`` value, usually the
+``file_digest`` of the source file; an item whose version or check does not
+match is a miss. Writes go through a temporary file and a rename, and
+failures to read or write are only logged: a broken cache costs a rebuild,
+never a failed build.
+
+Usage from another plugin:
+
+    import pelican_data
+    cache = pelican_data.PickleCache('my-plugin', version=1, directory='cache/my-plugin')
+    digest = pelican_data.file_digest(path)
+    data = cache.load(path, check=digest)
+    if data is None:
+        data = parse(path)
+        cache.save(path, data, check=digest)
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+
+logger = logging.getLogger(__name__)
+
+_digests = {}
+
+
+def file_digest(path):
+    """
+    Return the SHA-1 of the file contents, re-hashing only when the file's
+    size or modification time has changed since the last call.
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _digests.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    _digests[path] = (stamp, digest)
+    return digest
+
+
+class PickleCache(object):
+    """
+    A directory of pickled items, each stored under a ``name`` (e.g. the
+    path of its source file). A ``directory`` of None disables the cache:
+    every ``load`` misses and ``save`` does nothing.
+    """
+
+    def __init__(self, owner, version=1, directory=None):
+        self.owner = owner
+        self.version = version
+        self.directory = directory
+
+    def _file(self, name):
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.pickle')
+
+    def load(self, name, check=None):
+        """Return the item saved as ``name`` with ``check``, or None."""
+        if not self.directory:
+            return None
+        try:
+            with open(self._file(name), 'rb') as f:
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f'{self.owner}: ignoring unreadable cache for {name}: {e}')
+            return None
+        if payload.get('version') != self.version or payload.get('check') != check:
+            return None
+        return payload['data']
+
+    def save(self, name, data, check=None):
+        """Store ``data`` as ``name``, to be loaded with the same ``check``."""
+        if not self.directory:
+            return
+        payload = {'version': self.version, 'check': check, 'data': data}
+        target = self._file(name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(target + '.tmp', 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(target + '.tmp', target)
+        except OSError as e:
+            logger.debug(f'{self.owner}: could not write cache for {name}: {e}')
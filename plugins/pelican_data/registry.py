@@ -0,0 +1,59 @@
+"""
+Build-once registry for ``generator_init`` data plugins.
+
+Pelican sends ``generator_init`` for every generator of a build (articles,
+pages, static files, templates...), so a plugin that loads its data from
+that signal would do all of its work several times per build. All
+generators of a build share the context dict Pelican creates for that
+build, so the work only needs doing once: a plugin registers its builder
+with ``register_builder``, which runs it for the first generator of each
+build only. Later generators see what it added through the shared context.
+
+A new build is recognized by a new context object. At the end of each build
+the registry logs how many builder runs it avoided.
+"""
+
+import logging
+
+from pelican import signals
+
+logger = logging.getLogger(__name__)
+
+_context = None
+_avoided = {}
+
+
+def _run(generator, name, build):
+    global _context
+    if generator.context is not _context:
+        _context = generator.context
+        _avoided.clear()
+    if name in _avoided:
+        _avoided[name] += 1
+        return
+    _avoided[name] = 0
+    build(generator)
+
+
+def register_builder(name, build):
+    """
+    Run ``build(generator)`` from ``generator_init``, for the first
+    generator of each build only. ``name`` identifies the builder in logs.
+    """
+    def receiver(generator):
+        _run(generator, name, build)
+    # Signals only keep weak references by default
+    signals.generator_init.connect(receiver, weak=False)
+    return receiver
+
+
+def report(pelican_obj):
+    """Log the redundant builder runs avoided during the build."""
+    if not _avoided:
+        return
+    logger.info('pelican-data: built %d plugin data set(s) once, avoided %d '
+                'redundant generator_init run(s)',
+                len(_avoided), sum(_avoided.values()))
+    for name in sorted(_avoided):
+        logger.debug('pelican-data: %s ran once, reused %d time(s)',
+                     name, _avoided[name])
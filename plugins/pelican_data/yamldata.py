@@ -0,0 +1,84 @@
+"""
+Pelican Data Service
+====================
+
+Shared YAML loading for the plugins of this site.
+
+``pelican-collaborators``, ``pelican-projects``, ``pelican-media`` and
+``pelican-selected-publications`` read their configuration from YAML files
+in a ``generator_init`` handler, which runs once per generator. With this
+service each file is parsed once per build (with libyaml's ``CSafeLoader``
+when PyYAML was built with it), and not at all when it is unchanged since the
+last build, thanks to an on-disk cache keyed by its contents (see
+``filecache``).
+
+Parsed data is kept pickled, and every call returns a fresh copy: the
+plugins add defaults to the dicts they get, and must not see each other's
+(or an earlier generator's) changes.
+
+Configuration:
+    DATA_CACHE_PATH: Directory for the parse cache. Defaults to
+        ``CACHE_PATH/data``; ``None`` keeps the cache in memory.
+
+Usage from another plugin (inside a signal handler, once all plugins have
+been loaded):
+
+    import pelican_data
+    data = pelican_data.load_yaml('content/projects.yml')
+"""
+
+import logging
+import os
+import pickle
+
+from .filecache import PickleCache, file_digest
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the pickled data changes.
+CACHE_VERSION = 2
+
+_cache = PickleCache('pelican-data', CACHE_VERSION)
+_parsed = {}
+
+
+def _loader():
+    import yaml
+
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def load_yaml(yaml_file):
+    """
+    Return the data of ``yaml_file`` as ``yaml.safe_load`` would, parsing
+    the file only if it changed since it was last parsed. The result is the
+    caller's own copy.
+
+    Raises ``OSError`` and ``yaml.YAMLError`` like ``yaml.safe_load`` does.
+    """
+    import yaml
+
+    path = os.path.abspath(yaml_file)
+    digest = file_digest(path)
+    cached = _parsed.get(path)
+    if cached is not None and cached[0] == digest:
+        return pickle.loads(cached[1])
+
+    blob = _cache.load(path, check=digest)
+    if blob is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.load(f, Loader=_loader())
+        blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        _cache.save(path, blob, check=digest)
+        logger.debug(f'pelican-data: parsed {yaml_file}')
+    else:
+        logger.debug(f'pelican-data: loaded {yaml_file} from cache')
+    _parsed[path] = (digest, blob)
+    return pickle.loads(blob)
+
+
+def configure(pelican_obj):
+    """Read the cache location from the settings."""
+    settings = pelican_obj.settings
+    default = os.path.join(settings.get('CACHE_PATH', 'cache'), 'data')
+    _cache.directory = settings.get('DATA_CACHE_PATH', default)
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""
+Fast field scanner for BibTeX files.
+
+Usage:
+    python scripts/bibscan.py --verify [BIB ...]
+    python scripts/bibscan.py --benchmark [BIB ...]
+
+The citation scripts only need a few fields (doi, eprint, year) per entry.
+Parsing a large .bib file with pybtex builds Person objects for every author
+of every entry just to throw them away; this module tokenizes the file with
+a handful of regular expressions instead and only flattens the values of the
+fields that were asked for.
+
+Field values follow pybtex's rules: braces and quotes delimit strings (inner
+braces are kept), '#' concatenates, @string macros and month abbreviations
+are expanded, and runs of whitespace collapse to a single space. Unlike
+pybtex, the scanner never raises: malformed entries are skipped, and for
+duplicate keys or fields the first occurrence wins.
+
+--verify compares every field of every entry against pybtex (default: all
+.bib files in content/), --benchmark times both on the same files.
+"""
+
+import argparse
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+MONTH_NAMES = {
+    'jan': 'January', 'feb': 'February', 'mar': 'March', 'apr': 'April',
+    'may': 'May', 'jun': 'June', 'jul': 'July', 'aug': 'August',
+    'sep': 'September', 'oct': 'October', 'nov': 'November', 'dec': 'December',
+}
+
+# Same token definitions as pybtex's BibTeX parser
+NAME_CHARS = string.ascii_letters + "@!$&*+-./:;<>?[\\]^_`|~\x7f"
+NAME_RE = re.compile('[{0}][{1}]*'.format(re.escape(NAME_CHARS),
+                                          re.escape(NAME_CHARS + string.digits)))
+KEY_BRACE_RE = re.compile(r'[^\s,}]+')
+KEY_PAREN_RE = re.compile(r'[^\s,]+')
+NUMBER_RE = re.compile(r'[0-9]+')
+SPACE_RE = re.compile(r'\s*')
+WHITESPACE_RE = re.compile(r'\s+')
+BRACE_RE = re.compile(r'[{}]')
+QUOTE_RE = re.compile(r'["{}]')
+
+# Fields pybtex stores as people rather than as fields
+PERSON_FIELDS = ('author', 'editor')
+
+
+class ScanError(Exception):
+    pass
+
+
+class _Scanner(object):
+    __slots__ = ('text', 'pos', 'macros')
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.macros = dict(MONTH_NAMES)
+
+    def token(self, regex):
+        pos = SPACE_RE.match(self.text, self.pos).end()
+        match = regex.match(self.text, pos)
+        if match is None:
+            self.pos = pos
+            return None
+        self.pos = match.end()
+        return match.group()
+
+    def literal(self, char):
+        pos = SPACE_RE.match(self.text, self.pos).end()
+        if self.text.startswith(char, pos):
+            self.pos = pos + 1
+            return True
+        self.pos = pos
+        return False
+
+    def delimited(self, quoted):
+        """Return the string up to the closing quote or brace."""
+        text = self.text
+        start = self.pos
+        depth = 0
+        regex = QUOTE_RE if quoted else BRACE_RE
+        while True:
+            match = (regex if depth == 0 else BRACE_RE).search(text, self.pos)
+            if match is None:
+                raise ScanError('premature end of file')
+            char = match.group()
+            self.pos = match.end()
+            if char == '{':
+                depth += 1
+            elif depth > 0:
+                depth -= 1
+            elif quoted and char == '}':
+                raise ScanError('unbalanced braces')
+            else:
+                return text[start:self.pos - 1]
+
+    def value(self, wanted):
+        """Parse a (possibly concatenated) value, flattening it if wanted."""
+        parts = []
+        while True:
+            if self.literal('"'):
+                part = self.delimited(True)
+            elif self.literal('{'):
+                part = self.delimited(False)
+            else:
+                part = self.token(NUMBER_RE)
+                if part is None:
+                    name = self.token(NAME_RE)
+                    if name is None:
+                        raise ScanError('field value expected')
+                    part = self.macros.get(name.lower(), '') if wanted else ''
+            if wanted:
+                parts.append(part)
+            if not self.literal('#'):
+                break
+        if wanted:
+            return WHITESPACE_RE.sub(' ', ''.join(parts).strip())
+        return None
+
+
+def scan(text, fields=None):
+    """
+    Return ``{key: {field: value}}`` for the entries of the BibTeX ``text``.
+
+    ``fields`` is an iterable of (case-insensitive) field names to extract;
+    by default every field is returned. Field names are lower-cased in the
+    result, and entries lacking all requested fields map to an empty dict.
+    """
+    wanted = None if fields is None else set(field.lower() for field in fields)
+    scanner = _Scanner(text)
+    entries = {}
+    seen = set()
+    while True:
+        at = text.find('@', scanner.pos)
+        if at < 0:
+            return entries
+        scanner.pos = at + 1
+        try:
+            command = scanner.token(NAME_RE)
+            if command is None:
+                continue
+            if scanner.literal('{'):
+                key_re, end = KEY_BRACE_RE, '}'
+            elif scanner.literal('('):
+                key_re, end = KEY_PAREN_RE, ')'
+            else:
+                continue
+            command = command.lower()
+            if command == 'comment':
+                continue
+            if command == 'preamble':
+                scanner.value(False)
+            elif command == 'string':
+                name = scanner.token(NAME_RE)
+                if name is None or not scanner.literal('='):
+                    continue
+                scanner.macros[name.lower()] = scanner.value(True)
+            else:
+                key = scanner.token(key_re)
+                if key is None:
+                    continue
+                values = {}
+                while True:
+                    name = scanner.token(NAME_RE)
+                    if name is not None:
+                        if not scanner.literal('='):
+                            raise ScanError('"=" expected')
+                        name = name.lower()
+                        want = (wanted is None or name in wanted) and name not in values
+                        value = scanner.value(want)
+                        if want:
+                            values[name] = value
+                    if not scanner.literal(','):
+                        break
+                if not scanner.literal(end):
+                    raise ScanError('"%s" expected' % end)
+                if key.lower() not in seen:
+                    seen.add(key.lower())
+                    entries[key] = values
+        except ScanError:
+            continue
+
+
+def scan_file(path, fields=None):
+    """Scan the BibTeX file at ``path``; see ``scan``."""
+    with open(path, encoding='utf-8') as f:
+        return scan(f.read(), fields)
+
+
+def default_bib_files():
+    project_root = Path(__file__).parent.parent
+    return sorted((project_root / 'content').glob('*.bib'))
+
+
+def verify(paths):
+    """Compare every field of every entry with pybtex. Returns the mismatch count."""
+    from pybtex.database.input.bibtex import Parser
+
+    mismatches = 0
+    for path in paths:
+        bibdata = Parser().parse_file(str(path))
+        scanned = scan_file(path)
+        if list(scanned) != list(bibdata.entries.keys()):
+            print(f"{path.name}: keys differ")
+            mismatches += 1
+        checked = 0
+        for key, entry in bibdata.entries.items():
+            values = scanned.get(key, {})
+            expected = {name.lower(): value for name, value in entry.fields.items()}
+            got = {name: value for name, value in values.items()
+                   if name not in PERSON_FIELDS}
+            if got != expected:
+                for name in sorted(set(got) | set(expected)):
+                    if got.get(name) != expected.get(name):
+                        print(f"{path.name}: {key}.{name}: "
+                              f"{got.get(name)!r} != {expected.get(name)!r}")
+                        mismatches += 1
+            checked += len(expected)
+        print(f"{path.name}: {len(bibdata.entries)} entries, {checked} fields checked")
+    return mismatches
+
+
+def benchmark(paths, repeat=5):
+    from pybtex.database.input.bibtex import Parser
+
+    for path in paths:
+        timings = []
+        for parse in (lambda: Parser().parse_file(str(path)),
+                      lambda: scan_file(path, ('doi', 'eprint', 'year'))):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                parse()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+        print(f"{path.name}: pybtex {timings[0] * 1000:.1f} ms, "
+              f"bibscan {timings[1] * 1000:.1f} ms "
+              f"({timings[0] / timings[1]:.0f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('bib_files', nargs='*', type=Path,
+                        help='BibTeX files (default: content/*.bib)')
+    parser.add_argument('--verify', action='store_true',
+                        help='compare every field with pybtex')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='time pybtex and the scanner')
+    args = parser.parse_args()
+    paths = args.bib_files or default_bib_files()
+
+    if args.verify:
+        mismatches = verify(paths)
+        print('OK' if not mismatches else f'{mismatches} mismatches')
+        if mismatches:
+            sys.exit(1)
+    if args.benchmark:
+        benchmark(paths)
+    if not (args.verify or args.benchmark):
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
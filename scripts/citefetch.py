@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+"""
+Concurrent citation count fetching for the update_citations scripts.
+
+Lookups run on a small thread pool. Each worker thread keeps one keep-alive
+connection per API host, and each API has its own token bucket, so OpenAlex
+and Semantic Scholar requests overlap while each API still sees at most its
+configured request rate.
+
+The API base URLs default to the public services and can be overridden with
+the OPENALEX_API and SEMANTIC_SCHOLAR_API environment variables (or the
+scripts' command-line options), e.g. to run against a local mock server.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# OpenAlex API endpoint
+OPENALEX_API = os.environ.get('OPENALEX_API', "https://api.openalex.org/works")
+
+# Semantic Scholar API endpoint
+SEMANTIC_SCHOLAR_API = os.environ.get(
+    'SEMANTIC_SCHOLAR_API', "https://api.semanticscholar.org/graph/v1/paper")
+
+# Be polite - identify ourselves
+USER_AGENT = "TheoryAndPractice/1.0 (https://theoryandpractice.org; mailto:kyle.cranmer@wisc.edu)"
+
+# Requests per second for each API. OpenAlex's polite pool allows 10/s;
+# Semantic Scholar's public API is shared and throttles aggressively.
+OPENALEX_RATE = 10
+SEMANTIC_SCHOLAR_RATE = 1
+
+DEFAULT_WORKERS = 8
+FALLBACK_WORKERS = 2
+TIMEOUT = 10
+
+# DOIs per OpenAlex filter query; the API ORs up to 100 values of a filter
+# and returns up to 200 results per page
+OPENALEX_BATCH_SIZE = 50
+
+# Retries after a 429 response, and the longest Retry-After we honour
+MAX_RETRIES = 2
+MAX_RETRY_AFTER = 30
+
+
+class BudgetExhausted(Exception):
+    """Raised instead of sending a request once the run's budget is spent."""
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket allowing ``rate`` requests per second on
+    average, with bursts of up to ``burst`` requests.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve the token even if it is not there yet, so that
+            # concurrent callers queue up behind each other
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class HTTPClient(object):
+    """
+    Minimal JSON-over-HTTP client with per-thread keep-alive connections.
+    Sends at most ``budget`` requests (None for no limit).
+    """
+
+    def __init__(self, timeout=TIMEOUT, budget=None):
+        self.timeout = timeout
+        self.budget = budget
+        self.requests = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def _spend(self):
+        with self.lock:
+            if self.budget is not None and self.requests >= self.budget:
+                raise BudgetExhausted()
+            self.requests += 1
+
+    def _connection(self, scheme, netloc):
+        pool = getattr(self.local, 'pool', None)
+        if pool is None:
+            pool = self.local.pool = {}
+        conn = pool.get((scheme, netloc))
+        if conn is None:
+            cls = (http.client.HTTPSConnection if scheme == 'https'
+                   else http.client.HTTPConnection)
+            conn = pool[(scheme, netloc)] = cls(netloc, timeout=self.timeout)
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def _drop(self, scheme, netloc):
+        conn = self.local.pool.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def _request(self, scheme, netloc, path):
+        """Send one GET, reconnecting once if a kept-alive connection died."""
+        for attempt in (0, 1):
+            conn = self._connection(scheme, netloc)
+            try:
+                conn.request('GET', path, headers={'User-Agent': USER_AGENT,
+                                                   'Accept': 'application/json'})
+                response = conn.getresponse()
+                return response, response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError, http.client.CannotSendRequest):
+                self._drop(scheme, netloc)
+                if attempt:
+                    raise
+            except Exception:
+                self._drop(scheme, netloc)
+                raise
+
+    def get_json(self, url, bucket=None):
+        """
+        Return the decoded JSON at ``url``, or None on any failure. Takes a
+        token from ``bucket`` before each attempt, and raises
+        ``BudgetExhausted`` rather than exceed the request budget.
+        """
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        for attempt in range(MAX_RETRIES + 1):
+            self._spend()
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                response, body = self._request(parts.scheme, parts.netloc, path)
+            except Exception:
+                return None
+            if response.status == 429 and attempt < MAX_RETRIES:
+                try:
+                    delay = float(response.getheader('Retry-After', 1))
+                except ValueError:
+                    delay = 1
+                time.sleep(min(delay, MAX_RETRY_AFTER))
+                continue
+            if response.status != 200:
+                return None
+            try:
+                return json.loads(body.decode('utf-8'))
+            except ValueError:
+                return None
+        return None
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            del self.connections[:]
+
+
+def clean_arxiv_id(arxiv_id):
+    return arxiv_id.replace('arXiv:', '').strip()
+
+
+def normalize_doi(doi):
+    """Return ``doi`` lower-cased and without a resolver prefix."""
+    doi = doi.strip().lower()
+    for prefix in ('https://doi.org/', 'http://doi.org/', 'doi:'):
+        if doi.startswith(prefix):
+            return doi[len(prefix):]
+    return doi
+
+
+def lookup_doi(doi=None, arxiv_id=None):
+    """
+    Return the normalized DOI to look a paper up by: its own DOI, or the
+    DataCite DOI arXiv registers for every preprint (10.48550/arXiv.ID).
+    """
+    if doi:
+        return normalize_doi(doi)
+    if arxiv_id:
+        arxiv_id = re.sub(r'v\d+$', '', clean_arxiv_id(arxiv_id))
+        return normalize_doi('10.48550/arXiv.' + arxiv_id)
+    return None
+
+
+class CitationFetcher(object):
+    """
+    Looks up citation counts in OpenAlex, falling back to Semantic Scholar.
+    """
+
+    def __init__(self, openalex_api=None, semantic_scholar_api=None,
+                 workers=DEFAULT_WORKERS, openalex_rate=OPENALEX_RATE,
+                 semantic_scholar_rate=SEMANTIC_SCHOLAR_RATE,
+                 batch_size=OPENALEX_BATCH_SIZE, budget=None):
+        self.openalex_api = (openalex_api or OPENALEX_API).rstrip('/')
+        self.semantic_scholar_api = (semantic_scholar_api
+                                     or SEMANTIC_SCHOLAR_API).rstrip('/')
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.openalex_bucket = TokenBucket(openalex_rate)
+        self.semantic_scholar_bucket = TokenBucket(semantic_scholar_rate)
+        self.client = HTTPClient(budget=budget)
+        # Keys the last fetch_many could not look up within the budget
+        self.skipped = []
+
+    def fetch_from_openalex(self, doi=None, arxiv_id=None):
+        """Fetch citation count from OpenAlex for a given DOI or arXiv ID."""
+        if doi:
+            url = f"{self.openalex_api}/doi:{doi}"
+        elif arxiv_id:
+            url = f"{self.openalex_api}/arxiv:{clean_arxiv_id(arxiv_id)}"
+        else:
+            return None
+
+        data = self.client.get_json(url, self.openalex_bucket)
+        if data is None:
+            return None
+        return {
+            'cited_by_count': data.get('cited_by_count', 0),
+            'openalex_id': data.get('id', ''),
+            'source': 'openalex',
+        }
+
+    def fetch_openalex_batch(self, dois):
+        """
+        Look up several normalized DOIs with one ``filter=doi:a|b|c`` query.
+        Returns ``{doi: result}`` for the DOIs OpenAlex knows, or None if
+        the request failed.
+        """
+        values = '|'.join(urllib.parse.quote(doi, safe='/:') for doi in dois)
+        url = (f"{self.openalex_api}?filter=doi:{values}"
+               f"&per-page={len(dois)}&select=id,doi,cited_by_count")
+        data = self.client.get_json(url, self.openalex_bucket)
+        if data is None:
+            return None
+        results = {}
+        for work in data.get('results', []):
+            doi = normalize_doi(work.get('doi') or '')
+            results[doi] = {
+                'cited_by_count': work.get('cited_by_count', 0),
+                'openalex_id': work.get('id', ''),
+                'source': 'openalex',
+            }
+        return results
+
+    def fetch_from_semantic_scholar(self, doi=None, arxiv_id=None):
+        """Fetch citation count from Semantic Scholar as fallback."""
+        if doi:
+            url = f"{self.semantic_scholar_api}/DOI:{doi}?fields=citationCount,externalIds"
+        elif arxiv_id:
+            url = f"{self.semantic_scholar_api}/ARXIV:{clean_arxiv_id(arxiv_id)}?fields=citationCount,externalIds"
+        else:
+            return None
+
+        data = self.client.get_json(url, self.semantic_scholar_bucket)
+        if data is None:
+            return None
+        paper_id = data.get('paperId', '')
+        return {
+            'cited_by_count': data.get('citationCount', 0),
+            'semantic_scholar_id': f"https://www.semanticscholar.org/paper/{paper_id}" if paper_id else '',
+            'source': 'semantic_scholar',
+        }
+
+    def fetch_citation_count(self, doi=None, arxiv_id=None):
+        """Fetch citation count, trying OpenAlex first, then Semantic Scholar."""
+        result = self.fetch_from_openalex(doi=doi, arxiv_id=arxiv_id)
+        if result:
+            return result
+        return self.fetch_from_semantic_scholar(doi=doi, arxiv_id=arxiv_id)
+
+    def fetch_many(self, entries):
+        """
+        Look up every ``{key: entry}`` (entries as returned by
+        ``load_bibtex_entries``) concurrently. Yields ``(key, result)`` in
+        completion order, with ``result`` None for papers found nowhere.
+        Papers whose lookup ran out of request budget are not yielded but
+        listed in ``skipped``.
+
+        Papers are first looked up in OpenAlex in batches of ``batch_size``
+        DOIs (arXiv preprints by their arXiv DOI); only the misses, and the
+        papers of failed batches, get single OpenAlex lookups and then the
+        Semantic Scholar fallback. Those fallbacks run on their own small
+        pool, so that waiting for its much lower rate limit never holds up
+        the OpenAlex lookups of other papers.
+        """
+        self.skipped = []
+        with ThreadPoolExecutor(max_workers=self.workers) as primary, \
+                ThreadPoolExecutor(max_workers=FALLBACK_WORKERS) as fallback:
+            pending = {}
+
+            def submit(stage, key):
+                entry = entries[key]
+                if stage == 'openalex':
+                    method, executor = self.fetch_from_openalex, primary
+                else:
+                    method, executor = self.fetch_from_semantic_scholar, fallback
+                future = executor.submit(method, doi=entry.get('doi'),
+                                         arxiv_id=entry.get('arxiv_id'))
+                pending[future] = (stage, key)
+
+            # Group the papers by DOI; several keys may share one
+            by_doi = {}
+            for key, entry in entries.items():
+                doi = lookup_doi(entry.get('doi'), entry.get('arxiv_id'))
+                # '|' and ',' would split the filter value
+                if self.batch_size and doi and '|' not in doi and ',' not in doi:
+                    by_doi.setdefault(doi, []).append(key)
+                else:
+                    submit('openalex', key)
+            dois = list(by_doi)
+            for start in range(0, len(dois), self.batch_size or 1):
+                chunk = dois[start:start + self.batch_size]
+                pending[primary.submit(self.fetch_openalex_batch, chunk)] = ('batch', chunk)
+
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, item = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except BudgetExhausted:
+                            if stage == 'batch':
+                                for doi in item:
+                                    self.skipped.extend(by_doi[doi])
+                            else:
+                                self.skipped.append(item)
+                            continue
+                        if stage == 'batch':
+                            for doi in item:
+                                for key in by_doi[doi]:
+                                    if result and doi in result:
+                                        yield key, result[doi]
+                                    else:
+                                        submit('openalex', key)
+                        elif result is None and stage == 'openalex':
+                            submit('semantic_scholar', item)
+                        else:
+                            yield item, result
+            finally:
+                for future in pending:
+                    future.cancel()
+                self.client.close()
+
+
+def non_negative(value):
+    """argparse ``type`` for a count that may be 0 but not less."""
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value!r} is not a whole number')
+    if count < 0:
+        raise argparse.ArgumentTypeError(f'must be 0 or more, got {value}')
+    return count
+
+
+def add_arguments(parser, budget=0):
+    """
+    Add the fetcher's command-line options to an argparse ``parser``;
+    ``budget`` is the default of ``--budget`` (0 for no limit).
+    """
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'concurrent lookups (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--batch-size', type=int, default=OPENALEX_BATCH_SIZE,
+                        help='DOIs per OpenAlex query, 0 for single lookups '
+                             f'(default: {OPENALEX_BATCH_SIZE})')
+    parser.add_argument('--budget', type=non_negative, default=budget,
+                        help=f'most API requests to send, 0 for no limit (default: {budget})')
+    parser.add_argument('--openalex-api', default=OPENALEX_API,
+                        help='OpenAlex works endpoint (env: OPENALEX_API)')
+    parser.add_argument('--semantic-scholar-api', default=SEMANTIC_SCHOLAR_API,
+                        help='Semantic Scholar paper endpoint (env: SEMANTIC_SCHOLAR_API)')
+
+
+def from_arguments(args):
+    """Return a ``CitationFetcher`` configured from parsed ``add_arguments`` options."""
+    return CitationFetcher(openalex_api=args.openalex_api,
+                           semantic_scholar_api=args.semantic_scholar_api,
+                           workers=args.workers,
+                           batch_size=args.batch_size,
+                           budget=args.budget or None)
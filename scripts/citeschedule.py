@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Refresh scheduling for content/citations.json.
+
+Every fetched record carries a ``fetched_at`` timestamp. A record is due for
+a refresh once it is older than its TTL, which is shorter for papers whose
+counts move fastest: highly cited papers, and papers collecting many
+citations per year since publication. Due records are refreshed most
+overdue first, so that a run with a request budget spends it where the
+displayed counts are stalest.
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+
+# Base TTL in days for the citation count of an ordinary paper
+DEFAULT_MAX_AGE = 30
+
+# Most API requests of a scheduled run (--budget 0 lifts the limit)
+DEFAULT_BUDGET = 100
+
+# Highly cited papers, or papers gaining citations quickly (per year since
+# publication), are refreshed after a half or a quarter of the base TTL.
+WARM_CITATIONS, WARM_PER_YEAR = 100, 20
+HOT_CITATIONS, HOT_PER_YEAR = 1000, 100
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def positive_days(value):
+    """argparse ``type`` for a TTL in days, which must be more than 0."""
+    try:
+        days = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value!r} is not a number of days')
+    if not days > 0:
+        raise argparse.ArgumentTypeError(f'must be more than 0 days, got {value}')
+    return days
+
+
+def now_timestamp():
+    """Return the current UTC time as stored in ``fetched_at``."""
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime())
+
+
+def parse_timestamp(value):
+    """Return ``value`` (a ``fetched_at`` string) as an aware datetime, or None."""
+    try:
+        return datetime.strptime(value, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def ttl_days(record, max_age=DEFAULT_MAX_AGE, today=None):
+    """Return how many days ``record``'s citation count stays fresh."""
+    today = today or datetime.now(timezone.utc)
+    count = record.get('cited_by_count', 0) or 0
+    year = str(record.get('year', ''))
+    years = max(1, today.year - int(year) + 1) if year.isdigit() else 1
+    per_year = count / years
+    if count >= HOT_CITATIONS or per_year >= HOT_PER_YEAR:
+        return max_age / 4
+    if count >= WARM_CITATIONS or per_year >= WARM_PER_YEAR:
+        return max_age / 2
+    return max_age
+
+
+def staleness(record, max_age=DEFAULT_MAX_AGE, today=None):
+    """
+    Return the age of ``record`` as a multiple of its TTL: due from 1 on,
+    infinite for records never fetched (or fetched before timestamps).
+    """
+    today = today or datetime.now(timezone.utc)
+    fetched_at = parse_timestamp(record.get('fetched_at'))
+    if fetched_at is None:
+        return float('inf')
+    age = (today - fetched_at).total_seconds() / 86400
+    return age / ttl_days(record, max_age, today)
+
+
+def due_keys(keys, citations, max_age=DEFAULT_MAX_AGE, today=None):
+    """
+    Return the ``keys`` whose records in ``citations`` are due for a
+    refresh (missing records included), most overdue first.
+    """
+    today = today or datetime.now(timezone.utc)
+    scored = []
+    for key in keys:
+        record = citations.get(key)
+        score = float('inf') if record is None else staleness(record, max_age, today)
+        if score >= 1:
+            scored.append((-score, key))
+    scored.sort()
+    return [key for _, key in scored]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Crash-safe storage for content/citations.json.
+
+The citation scripts checkpoint their results while they fetch: every
+``CHECKPOINT_EVERY`` results or ``CHECKPOINT_INTERVAL`` seconds the current
+state is written to a temporary file next to citations.json and renamed over
+it, so an interrupted run never leaves a truncated file and keeps everything
+fetched so far. Files are only rewritten when their content changed.
+
+While a run is in progress, a small marker file (citations.json.run) records
+when it started. ``--resume`` uses it to skip the keys whose records were
+already fetched by the interrupted run.
+"""
+
+import json
+import os
+import stat
+import tempfile
+import time
+
+CHECKPOINT_EVERY = 25
+CHECKPOINT_INTERVAL = 10
+
+
+def dumps(citations):
+    return json.dumps(citations, indent=2, sort_keys=True)
+
+
+def load(path):
+    """Return the records stored at ``path``, or {} if there are none."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def write_atomic(path, text):
+    """
+    Replace ``path`` with ``text`` via a temporary file and a rename. The
+    file keeps its mode (0644 for a new file).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path),
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file 0600
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def save(path, citations):
+    """
+    Write ``citations`` to ``path`` unless the file already holds exactly
+    that content. Returns whether the file was written.
+    """
+    text = dumps(citations)
+    try:
+        with open(path, 'r') as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    write_atomic(path, text)
+    return True
+
+
+class Checkpointer(object):
+    """
+    Periodically saves the records of a run in progress to ``path``.
+    ``update`` is called after every result; ``save`` forces a write.
+    """
+
+    def __init__(self, path, every=CHECKPOINT_EVERY, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.every = every
+        self.interval = interval
+        self.pending = 0
+        self.saved_at = time.monotonic()
+        self.writes = 0
+
+    def update(self, citations):
+        self.pending += 1
+        if (self.pending >= self.every
+                or time.monotonic() - self.saved_at >= self.interval):
+            self.save(citations)
+
+    def save(self, citations):
+        if save(self.path, citations):
+            self.writes += 1
+        self.pending = 0
+        self.saved_at = time.monotonic()
+
+
+def run_marker(path):
+    return path + '.run'
+
+
+def start_run(path, started_at):
+    """Record that a run which started at ``started_at`` is in progress."""
+    write_atomic(run_marker(path), json.dumps({'started_at': started_at}) + '\n')
+
+
+def interrupted_run(path):
+    """Return the start time of the interrupted run on ``path``, if any."""
+    try:
+        with open(run_marker(path), 'r') as f:
+            return json.load(f).get('started_at')
+    except (OSError, ValueError):
+        return None
+
+
+def finish_run(path):
+    try:
+        os.unlink(run_marker(path))
+    except FileNotFoundError:
+        pass
@@ -3,19 +3,37 @@
 Fetch Collaborator Photos
 =========================
 
-Downloads avatar images from GitHub and Bluesky for collaborators
-and saves them locally for faster loading and reliability.
+Downloads avatar images from GitHub and Bluesky (or the photo URL given in
+the YAML) for collaborators and turns them into small local thumbnails, so
+the collaborators page loads a few KB per face from our own origin.
+
+Each photo is cropped square and saved at every width in THUMB_WIDTHS (1x
+and 2x of the displayed size), as WebP and as a JPEG fallback, under
+content-hash filenames:
+
+    content/images/collaborators/thumbs/{name-slug}-{hash}-{width}.{webp,jpg}
+
+The hash covers the source image and the encoding settings, so a file name
+never changes meaning and the thumbnails can be served with long cache
+lifetimes. The manifest (content/collaborator-photos.json) maps each name to
+its thumbnails; pelican-collaborators uses it to rewrite `photo` to local
+`srcset`s. Unchanged photos are neither downloaded nor encoded again, and
+thumbnails no longer in the manifest are removed.
 
 Usage:
     python scripts/fetch-collaborator-photos.py [--dry-run] [--force]
 
 Options:
     --dry-run   Show what would be downloaded without actually downloading
-    --force     Re-download even if local file exists
+    --force     Re-download and re-encode even if local files exist
+
+Requires Pillow (pip install pillow).
 """
 
 import argparse
 import hashlib
+import io
+import json
 import os
 import sys
 from pathlib import Path
@@ -24,11 +42,22 @@ from urllib.parse import urlparse
 import requests
 import yaml
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
 
 # Configuration
 YAML_PATH = "content/collaborators.yml"
 OUTPUT_DIR = "content/images/collaborators"
-IMAGE_SIZE = 200  # Size for GitHub avatars
+THUMBS_DIR = "content/images/collaborators/thumbs"
+THUMBS_URL = "/images/collaborators/thumbs"
+MANIFEST_PATH = "content/collaborator-photos.json"
+THUMB_WIDTHS = (120, 240)  # 1x and 2x of the photo size in collaborators.html
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+IMAGE_SIZE = max(THUMB_WIDTHS)  # Size for GitHub avatars
 
 
 def slugify(name: str) -> str:
@@ -43,6 +72,22 @@ def slugify(name: str) -> str:
     return slug.strip("-")
 
 
+def photo_source(person: dict) -> str | None:
+    """
+    Identify where a person's photo comes from: the explicit `photo`, else
+    "github:<user>" or "bluesky:<handle>". Must match the plugin's
+    photo_source(), which ignores manifest entries for another source.
+    """
+    links = person.get("links") or {}
+    if person.get("photo"):
+        return person["photo"]
+    if links.get("github"):
+        return f"github:{links['github']}"
+    if links.get("bluesky"):
+        return f"bluesky:{links['bluesky']}"
+    return None
+
+
 def get_github_avatar_url(username: str) -> str:
     """Generate GitHub avatar URL."""
     return f"https://github.com/{username}.png?size={IMAGE_SIZE}"
@@ -64,12 +109,21 @@ def get_bluesky_avatar_url(handle: str) -> str | None:
         return None
 
 
-def download_image(url: str, output_path: Path, dry_run: bool = False) -> bool:
-    """Download an image from URL to local path."""
+def source_url(source: str) -> str | None:
+    """Return the URL to download the photo identified by `source` from."""
+    if source.startswith("github:"):
+        return get_github_avatar_url(source[len("github:"):])
+    if source.startswith("bluesky:"):
+        return get_bluesky_avatar_url(source[len("bluesky:"):])
+    return source
+
+
+def download_image(url: str, output_path: Path, dry_run: bool = False) -> Path | None:
+    """Download an image from URL to local path. Returns the path written."""
     if dry_run:
         print(f"  Would download: {url}")
         print(f"    -> {output_path}")
-        return True
+        return None
 
     try:
         response = requests.get(url, timeout=30, stream=True)
@@ -97,17 +151,22 @@ def download_image(url: str, output_path: Path, dry_run: bool = False) -> bool:
         # Ensure directory exists
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
+        # Replace any copy with another extension
+        existing = get_existing_photo(output_path.parent, output_path.stem)
+        if existing and existing != output_path:
+            existing.unlink()
+
         # Write file
         with open(output_path, "wb") as f:
             for chunk in response.iter_content(chunk_size=8192):
                 f.write(chunk)
 
         print(f"  Downloaded: {output_path}")
-        return True
+        return output_path
 
     except Exception as e:
         print(f"  Error downloading {url}: {e}")
-        return False
+        return None
 
 
 def get_existing_photo(output_dir: Path, slug: str) -> Path | None:
@@ -119,18 +178,114 @@ def get_existing_photo(output_dir: Path, slug: str) -> Path | None:
     return None
 
 
+def thumbnail_hash(data: bytes) -> str:
+    """Content hash of a source image and the settings its thumbnails use."""
+    digest = hashlib.sha256(data)
+    digest.update(repr((THUMB_WIDTHS, WEBP_QUALITY, JPEG_QUALITY)).encode())
+    return digest.hexdigest()[:12]
+
+
+def make_thumbnails(data: bytes, stem: str, thumbs_dir: Path, force: bool = False) -> list:
+    """
+    Write the square WebP and JPEG thumbnails of the image `data` as
+    `{stem}-{width}.webp/.jpg`, skipping files that already exist. Returns
+    the widths made.
+    """
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        # Flatten transparency onto the page background
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+
+    # Never upscale, but always keep the smallest size
+    largest = min(image.size)
+    widths = [w for w in THUMB_WIDTHS if w <= largest] or [min(THUMB_WIDTHS)]
+
+    thumbs_dir.mkdir(parents=True, exist_ok=True)
+    for width in widths:
+        webp_path = thumbs_dir / f"{stem}-{width}.webp"
+        jpeg_path = thumbs_dir / f"{stem}-{width}.jpg"
+        if webp_path.exists() and jpeg_path.exists() and not force:
+            continue
+        thumb = ImageOps.fit(image, (width, width), Image.LANCZOS)
+        thumb.save(webp_path, "WEBP", quality=WEBP_QUALITY, method=6)
+        thumb.save(jpeg_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return widths
+
+
+def manifest_entry(source: str, stem: str, widths: list) -> dict:
+    """Describe a person's thumbnails for the plugin."""
+    def srcset(ext):
+        return ", ".join(f"{THUMBS_URL}/{stem}-{w}.{ext} {w}w" for w in widths)
+    return {
+        "source": source,
+        "src": f"{THUMBS_URL}/{stem}-{widths[0]}.jpg",
+        "width": widths[0],
+        "srcset": srcset("jpg"),
+        "webp_srcset": srcset("webp"),
+    }
+
+
+def load_manifest(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path: Path, manifest: dict) -> bool:
+    """Write the manifest if it changed. Returns whether it was written."""
+    text = json.dumps(manifest, indent=2, sort_keys=True) + "\n"
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return False
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+    return True
+
+
+def thumbnail_files(entry: dict) -> list:
+    """Return the file names of the thumbnails of a manifest entry."""
+    return [candidate.split(" ")[0].rsplit("/", 1)[-1]
+            for srcset in (entry["srcset"], entry["webp_srcset"])
+            for candidate in srcset.split(", ")]
+
+
+def prune_thumbnails(thumbs_dir: Path, manifest: dict) -> int:
+    """Remove the thumbnails no manifest entry refers to."""
+    used = set()
+    for entry in manifest.values():
+        used.update(thumbnail_files(entry))
+    removed = 0
+    if thumbs_dir.exists():
+        for path in thumbs_dir.iterdir():
+            if path.suffix in (".webp", ".jpg") and path.name not in used:
+                path.unlink()
+                removed += 1
+    return removed
+
+
 def main():
     parser = argparse.ArgumentParser(description="Fetch collaborator photos")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be done")
-    parser.add_argument("--force", action="store_true", help="Re-download existing files")
+    parser.add_argument("--force", action="store_true", help="Re-download and re-encode existing files")
     args = parser.parse_args()
 
+    if Image is None:
+        print("Error: Pillow is required to make thumbnails (pip install pillow)")
+        sys.exit(1)
+
     # Find project root (where this script is in scripts/)
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
 
     yaml_path = project_root / YAML_PATH
     output_dir = project_root / OUTPUT_DIR
+    thumbs_dir = project_root / THUMBS_DIR
+    manifest_path = project_root / MANIFEST_PATH
 
     if not yaml_path.exists():
         print(f"Error: YAML file not found: {yaml_path}")
@@ -145,71 +300,92 @@ def main():
     print(f"Output directory: {output_dir}")
     print()
 
-    stats = {"downloaded": 0, "skipped": 0, "failed": 0, "no_source": 0}
+    old_manifest = load_manifest(manifest_path)
+    manifest = {}
+    stats = {"downloaded": 0, "thumbnailed": 0, "skipped": 0, "failed": 0, "no_source": 0}
 
     for person in people:
         name = person.get("name", "Unknown")
         slug = slugify(name)
-        links = person.get("links", {})
 
         print(f"Processing: {name}")
 
-        # Check if already has explicit local photo
-        existing_photo = person.get("photo")
-        if existing_photo and existing_photo.startswith("/images/"):
-            print(f"  Already has local photo: {existing_photo}")
-            stats["skipped"] += 1
+        source = photo_source(person)
+        if not source:
+            print("  No photo, GitHub or Bluesky profile found")
+            stats["no_source"] += 1
             continue
 
-        # Check if local file already exists
-        existing_file = get_existing_photo(output_dir, slug)
-        if existing_file and not args.force:
-            print(f"  Already exists: {existing_file.name}")
+        # Keep the current thumbnails if this photo cannot be refreshed
+        previous = old_manifest.get(name)
+        if previous and previous.get("source") == source:
+            manifest[name] = previous
+
+        # Find the original: a photo in content/, or a download cached by slug
+        if source.startswith("/images/"):
+            original = project_root / "content" / source.lstrip("/")
+            if not original.exists():
+                print(f"  Error: local photo not found: {original}")
+                stats["failed"] += 1
+                continue
+        else:
+            original = get_existing_photo(output_dir, slug)
+            if not original or name not in manifest or args.force:
+                url = source_url(source)
+                if not url:
+                    print(f"  No avatar available for {source}")
+                    stats["no_source"] += 1
+                    continue
+                print(f"  Source: {source}")
+                original = download_image(url, output_dir / f"{slug}.jpg", dry_run=args.dry_run)
+                if args.dry_run:
+                    stats["downloaded"] += 1
+                    continue
+                if not original:
+                    stats["failed"] += 1
+                    continue
+                stats["downloaded"] += 1
+
+        # Thumbnails are named after the content they are made from
+        stem = f"{slug}-{thumbnail_hash(original.read_bytes())}"
+        current = manifest.get(name)
+        if (current and not args.force
+                and all(f.startswith(stem + "-") and (thumbs_dir / f).exists()
+                        for f in thumbnail_files(current))):
+            print(f"  Up to date: {stem}")
             stats["skipped"] += 1
             continue
-
-        # Determine source URL (priority: GitHub > Bluesky)
-        source_url = None
-        source_type = None
-
-        if links.get("github"):
-            source_url = get_github_avatar_url(links["github"])
-            source_type = "GitHub"
-        elif links.get("bluesky"):
-            source_url = get_bluesky_avatar_url(links["bluesky"])
-            source_type = "Bluesky"
-
-        if not source_url:
-            print("  No GitHub or Bluesky profile found")
-            stats["no_source"] += 1
+        if args.dry_run:
+            print(f"  Would make thumbnails: {stem}")
+            stats["thumbnailed"] += 1
             continue
-
-        print(f"  Source: {source_type} ({links.get('github') or links.get('bluesky')})")
-
-        # Download
-        output_path = output_dir / f"{slug}.jpg"  # Extension will be corrected
-        if download_image(source_url, output_path, dry_run=args.dry_run):
-            stats["downloaded"] += 1
-        else:
+        try:
+            widths = make_thumbnails(original.read_bytes(), stem, thumbs_dir, force=args.force)
+        except Exception as e:
+            print(f"  Error making thumbnails from {original}: {e}")
             stats["failed"] += 1
+            continue
+        print(f"  Thumbnails: {stem} ({', '.join(str(w) for w in widths)}px)")
+        manifest[name] = manifest_entry(source, stem, widths)
+        stats["thumbnailed"] += 1
+
+    if not args.dry_run:
+        if save_manifest(manifest_path, manifest):
+            print(f"\nSaved {len(manifest)} entries to {manifest_path}")
+        removed = prune_thumbnails(thumbs_dir, manifest)
+        if removed:
+            print(f"Removed {removed} unused thumbnail(s)")
 
     # Summary
     print()
     print("=" * 50)
     print("Summary:")
     print(f"  Downloaded: {stats['downloaded']}")
-    print(f"  Skipped (existing): {stats['skipped']}")
+    print(f"  Thumbnailed: {stats['thumbnailed']}")
+    print(f"  Up to date: {stats['skipped']}")
     print(f"  Failed: {stats['failed']}")
     print(f"  No source available: {stats['no_source']}")
 
-    if not args.dry_run and stats["downloaded"] > 0:
-        print()
-        print("Next steps:")
-        print("1. Review downloaded images in content/images/collaborators/")
-        print("2. Update collaborators.yml to use local paths:")
-        print('   photo: "/images/collaborators/person-name.jpg"')
-        print("3. Or run with --update-yaml to auto-update (coming soon)")
-
 
 if __name__ == "__main__":
     main()
@@ -3,119 +3,54 @@
 Fetch citation counts from OpenAlex API for selected publications.
 
 Usage:
-    python scripts/update_citations.py
+    python scripts/update_citations.py [--all] [--max-age DAYS] [--budget N]
 
 Reads DOIs and arXiv IDs from the BibTeX file referenced in selected-publications.yml
 and fetches citation counts from OpenAlex. Results are cached in content/citations.json.
+
+Each record remembers when it was fetched; by default only records older than
+their TTL are refreshed (see citeschedule.py), most overdue first, and --budget
+caps the number of API requests of a run (100 by default, 0 for no limit).
+--all refreshes every record; combine it with --budget 0 to refresh them all
+in one run.
+
+Results are checkpointed atomically while fetching (see citestore.py); after
+an interruption, --resume continues without re-fetching what was done.
 """
 
+import argparse
 import json
 import os
+import sys
 import time
-import urllib.request
-import urllib.parse
 from pathlib import Path
 
 import yaml
 
-# OpenAlex API endpoint
-OPENALEX_API = "https://api.openalex.org/works"
-
-# Be polite - identify ourselves
-USER_AGENT = "TheoryAndPractice/1.0 (https://theoryandpractice.org; mailto:kyle.cranmer@wisc.edu)"
-
-
-def fetch_from_openalex(doi=None, arxiv_id=None):
-    """Fetch citation count from OpenAlex for a given DOI or arXiv ID."""
-    if doi:
-        url = f"{OPENALEX_API}/doi:{doi}"
-    elif arxiv_id:
-        clean_arxiv = arxiv_id.replace('arXiv:', '').strip()
-        url = f"{OPENALEX_API}/arxiv:{clean_arxiv}"
-    else:
-        return None
-
-    try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', USER_AGENT)
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            return {
-                'cited_by_count': data.get('cited_by_count', 0),
-                'openalex_id': data.get('id', ''),
-                'source': 'openalex',
-            }
-    except urllib.error.HTTPError:
-        return None
-    except Exception:
-        return None
-
-
-# Semantic Scholar API endpoint
-SEMANTIC_SCHOLAR_API = "https://api.semanticscholar.org/graph/v1/paper"
-
-
-def fetch_from_semantic_scholar(doi=None, arxiv_id=None):
-    """Fetch citation count from Semantic Scholar as fallback."""
-    if doi:
-        url = f"{SEMANTIC_SCHOLAR_API}/DOI:{doi}?fields=citationCount,externalIds"
-    elif arxiv_id:
-        clean_arxiv = arxiv_id.replace('arXiv:', '').strip()
-        url = f"{SEMANTIC_SCHOLAR_API}/ARXIV:{clean_arxiv}?fields=citationCount,externalIds"
-    else:
-        return None
-
-    try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', USER_AGENT)
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            paper_id = data.get('paperId', '')
-            return {
-                'cited_by_count': data.get('citationCount', 0),
-                'semantic_scholar_id': f"https://www.semanticscholar.org/paper/{paper_id}" if paper_id else '',
-                'source': 'semantic_scholar',
-            }
-    except urllib.error.HTTPError:
-        return None
-    except Exception:
-        return None
-
-
-def fetch_citation_count(doi=None, arxiv_id=None):
-    """Fetch citation count, trying OpenAlex first, then Semantic Scholar."""
-    # Try OpenAlex first
-    result = fetch_from_openalex(doi=doi, arxiv_id=arxiv_id)
-    if result:
-        return result
-
-    # Fallback to Semantic Scholar
-    result = fetch_from_semantic_scholar(doi=doi, arxiv_id=arxiv_id)
-    if result:
-        return result
-
-    return None
+import citefetch
+import citestore
+import citeschedule
+from bibscan import scan_file
 
 
 def load_bibtex_entries(bibtex_path):
-    """Load BibTeX entries and extract DOI/arXiv IDs."""
+    """
+    Load BibTeX entries and extract DOI/arXiv IDs.
+
+    Uses bibscan, which reads only the fields needed here; its values match
+    pybtex's (check with ``python scripts/bibscan.py --verify``).
+    """
     try:
-        from pybtex.database.input.bibtex import Parser
-        bibdata = Parser().parse_file(bibtex_path)
-    except ImportError:
-        print("pybtex not installed. Run: pip install pybtex")
-        return {}
+        fields_by_key = scan_file(bibtex_path, ('doi', 'eprint', 'year'))
     except Exception as e:
         print(f"Error parsing BibTeX: {e}")
         return {}
 
     entries = {}
-    for key, entry in bibdata.entries.items():
-        doi = entry.fields.get('doi', '').strip()
-        eprint = entry.fields.get('eprint', '').strip()
-        year = entry.fields.get('year', '')
+    for key, fields in fields_by_key.items():
+        doi = fields.get('doi', '').strip()
+        eprint = fields.get('eprint', '').strip()
+        year = fields.get('year', '')
 
         entries[key] = {
             'doi': doi if doi else None,
@@ -127,6 +62,18 @@ def load_bibtex_entries(bibtex_path):
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--all', action='store_true',
+                        help='refresh every record, however recently fetched')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the records an interrupted run already fetched')
+    parser.add_argument('--max-age', type=citeschedule.positive_days, default=citeschedule.DEFAULT_MAX_AGE,
+                        help='days before an ordinary record is refreshed '
+                             f'(default: {citeschedule.DEFAULT_MAX_AGE}; '
+                             'shorter for highly cited papers)')
+    citefetch.add_arguments(parser, budget=citeschedule.DEFAULT_BUDGET)
+    args = parser.parse_args()
+
     # Find the project root
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
@@ -176,68 +123,115 @@ def main():
 
     # Load existing citations cache
     citations_path = project_root / 'content' / 'citations.json'
-    existing_citations = {}
-    if citations_path.exists():
-        with open(citations_path, 'r') as f:
-            existing_citations = json.load(f)
+    existing_citations = citestore.load(str(citations_path))
+    if existing_citations:
         print(f"Loaded {len(existing_citations)} existing citations from cache")
 
-    # Fetch citations for each publication
+    # Collect the publications to look up
     citations = {}
-    for i, key in enumerate(sorted(pub_keys)):
+    candidates = []
+    for key in sorted(pub_keys):
         # Skip if we have a manual override
         if key in manual_citations:
             citations[key] = manual_citations[key]
-            print(f"  [{i+1}/{len(pub_keys)}] {key}: using manual override ({manual_citations[key].get('cited_by_count', 0)} citations)")
+            print(f"  {key}: using manual override ({manual_citations[key].get('cited_by_count', 0)} citations)")
             continue
 
         if key not in bibtex_entries:
-            print(f"  [{i+1}/{len(pub_keys)}] {key}: not in BibTeX")
+            print(f"  {key}: not in BibTeX")
             continue
 
-        entry = bibtex_entries[key]
-        doi = entry.get('doi')
-        arxiv_id = entry.get('arxiv_id')
-
-        print(f"  [{i+1}/{len(pub_keys)}] {key}...", end=" ")
-
-        result = fetch_citation_count(doi=doi, arxiv_id=arxiv_id)
-
-        if result:
-            citation_entry = {
-                'cited_by_count': result['cited_by_count'],
-                'year': entry.get('year', ''),
-            }
-            # Store the appropriate ID based on source
-            if result.get('source') == 'openalex':
-                citation_entry['openalex_id'] = result.get('openalex_id', '')
-                print(f"{result['cited_by_count']} citations (OpenAlex)")
-            elif result.get('source') == 'semantic_scholar':
-                citation_entry['semantic_scholar_id'] = result.get('semantic_scholar_id', '')
-                print(f"{result['cited_by_count']} citations (Semantic Scholar)")
-            else:
-                print(f"{result['cited_by_count']} citations")
-            citations[key] = citation_entry
+        candidates.append(key)
+
+    # Refresh only the stale records, most overdue first; keep the others
+    if args.all:
+        due = candidates
+    else:
+        due = citeschedule.due_keys(candidates, existing_citations, args.max_age)
+    for key in candidates:
+        if key in existing_citations:
+            citations[key] = existing_citations[key]
+    if args.resume:
+        # Skip what the interrupted run already fetched
+        interrupted = citestore.interrupted_run(str(citations_path))
+        if interrupted:
+            done = [key for key in due
+                    if existing_citations.get(key, {}).get('fetched_at', '') >= interrupted]
+            due = [key for key in due if key not in done]
+            print(f"Resuming the run started {interrupted}: {len(done)} records already fetched")
         else:
-            # Keep existing data if we have it
-            if key in existing_citations:
-                citations[key] = existing_citations[key]
-                print(f"using cached: {existing_citations[key].get('cited_by_count', 0)} citations")
+            print("No interrupted run to resume")
+    to_fetch = {key: bibtex_entries[key] for key in due}
+    print(f"{len(to_fetch)} of {len(candidates)} records due for a refresh")
+
+    # Fetch them concurrently; results arrive in completion order
+    fetcher = citefetch.from_arguments(args)
+    fetched_at = citeschedule.now_timestamp()
+    print(f"Fetching {len(to_fetch)} citation counts with {fetcher.workers} workers...")
+    started = time.monotonic()
+
+    # Checkpoint while fetching, so an interrupted run keeps its results
+    checkpoint = citestore.Checkpointer(str(citations_path))
+    if to_fetch:
+        citestore.start_run(str(citations_path), fetched_at)
+    try:
+        for i, (key, result) in enumerate(fetcher.fetch_many(to_fetch)):
+            entry = to_fetch[key]
+            prefix = f"  [{i+1}/{len(to_fetch)}] {key}:"
+
+            if result:
+                citation_entry = {
+                    'cited_by_count': result['cited_by_count'],
+                    'year': entry.get('year', ''),
+                    'fetched_at': fetched_at,
+                }
+                # Store the appropriate ID based on source
+                if result.get('source') == 'openalex':
+                    citation_entry['openalex_id'] = result.get('openalex_id', '')
+                    print(f"{prefix} {result['cited_by_count']} citations (OpenAlex)")
+                elif result.get('source') == 'semantic_scholar':
+                    citation_entry['semantic_scholar_id'] = result.get('semantic_scholar_id', '')
+                    print(f"{prefix} {result['cited_by_count']} citations (Semantic Scholar)")
+                else:
+                    print(f"{prefix} {result['cited_by_count']} citations")
+                citations[key] = citation_entry
             else:
+                # Keep existing data if we have it, but don't ask again
+                # before the record's TTL is up
+                if key in existing_citations:
+                    citations[key] = dict(existing_citations[key], fetched_at=fetched_at)
+                    print(f"{prefix} using cached: {existing_citations[key].get('cited_by_count', 0)} citations")
+                else:
+                    citations[key] = {
+                        'cited_by_count': 0,
+                        'year': entry.get('year', ''),
+                        'fetched_at': fetched_at,
+                    }
+                    print(f"{prefix} no data")
+            checkpoint.update(citations)
+    except KeyboardInterrupt:
+        checkpoint.save(citations)
+        print("\nInterrupted: progress saved, run again with --resume to continue")
+        sys.exit(130)
+    print(f"Fetched in {time.monotonic() - started:.1f}s "
+          f"({fetcher.client.requests} requests)")
+
+    # Records the budget did not reach are due first in the next run
+    if fetcher.skipped:
+        print(f"Request budget spent: {len(fetcher.skipped)} records left for the next run")
+        for key in fetcher.skipped:
+            if key not in citations:
                 citations[key] = {
                     'cited_by_count': 0,
-                    'year': entry.get('year', ''),
+                    'year': bibtex_entries[key].get('year', ''),
                 }
-                print("no data")
-
-        # Be polite to the API
-        time.sleep(0.1)
 
     # Save citations
-    with open(citations_path, 'w') as f:
-        json.dump(citations, f, indent=2, sort_keys=True)
-
-    print(f"\nSaved {len(citations)} citations to {citations_path}")
+    if citestore.save(str(citations_path), citations):
+        print(f"\nSaved {len(citations)} citations to {citations_path}")
+    else:
+        print(f"\n{citations_path} is up to date ({len(citations)} citations)")
+    citestore.finish_run(str(citations_path))
     if manual_citations:
         print(f"  ({len(manual_citations)} from manual overrides)")
 
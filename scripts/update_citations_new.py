@@ -10,112 +10,38 @@ citations for entries that don't already exist in content/citations.json.
 Useful when adding new publications without re-fetching everything.
 """
 
+import argparse
 import json
 import os
-import time
-import urllib.request
+import sys
 from pathlib import Path
 
 import yaml
 
-# OpenAlex API endpoint
-OPENALEX_API = "https://api.openalex.org/works"
-
-# Be polite - identify ourselves
-USER_AGENT = "TheoryAndPractice/1.0 (https://theoryandpractice.org; mailto:kyle.cranmer@wisc.edu)"
-
-
-def fetch_from_openalex(doi=None, arxiv_id=None):
-    """Fetch citation count from OpenAlex for a given DOI or arXiv ID."""
-    if doi:
-        url = f"{OPENALEX_API}/doi:{doi}"
-    elif arxiv_id:
-        clean_arxiv = arxiv_id.replace('arXiv:', '').strip()
-        url = f"{OPENALEX_API}/arxiv:{clean_arxiv}"
-    else:
-        return None
-
-    try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', USER_AGENT)
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            return {
-                'cited_by_count': data.get('cited_by_count', 0),
-                'openalex_id': data.get('id', ''),
-                'source': 'openalex',
-            }
-    except urllib.error.HTTPError:
-        return None
-    except Exception:
-        return None
-
-
-# Semantic Scholar API endpoint
-SEMANTIC_SCHOLAR_API = "https://api.semanticscholar.org/graph/v1/paper"
-
-
-def fetch_from_semantic_scholar(doi=None, arxiv_id=None):
-    """Fetch citation count from Semantic Scholar as fallback."""
-    if doi:
-        url = f"{SEMANTIC_SCHOLAR_API}/DOI:{doi}?fields=citationCount,externalIds"
-    elif arxiv_id:
-        clean_arxiv = arxiv_id.replace('arXiv:', '').strip()
-        url = f"{SEMANTIC_SCHOLAR_API}/ARXIV:{clean_arxiv}?fields=citationCount,externalIds"
-    else:
-        return None
-
-    try:
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', USER_AGENT)
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            paper_id = data.get('paperId', '')
-            return {
-                'cited_by_count': data.get('citationCount', 0),
-                'semantic_scholar_id': f"https://www.semanticscholar.org/paper/{paper_id}" if paper_id else '',
-                'source': 'semantic_scholar',
-            }
-    except urllib.error.HTTPError:
-        return None
-    except Exception:
-        return None
-
-
-def fetch_citation_count(doi=None, arxiv_id=None):
-    """Fetch citation count, trying OpenAlex first, then Semantic Scholar."""
-    # Try OpenAlex first
-    result = fetch_from_openalex(doi=doi, arxiv_id=arxiv_id)
-    if result:
-        return result
-
-    # Fallback to Semantic Scholar
-    result = fetch_from_semantic_scholar(doi=doi, arxiv_id=arxiv_id)
-    if result:
-        return result
-
-    return None
+import citefetch
+import citestore
+import citeschedule
+from bibscan import scan_file
 
 
 def load_bibtex_entries(bibtex_path):
-    """Load BibTeX entries and extract DOI/arXiv IDs."""
+    """
+    Load BibTeX entries and extract DOI/arXiv IDs.
+
+    Uses bibscan, which reads only the fields needed here; its values match
+    pybtex's (check with ``python scripts/bibscan.py --verify``).
+    """
     try:
-        from pybtex.database.input.bibtex import Parser
-        bibdata = Parser().parse_file(bibtex_path)
-    except ImportError:
-        print("pybtex not installed. Run: pip install pybtex")
-        return {}
+        fields_by_key = scan_file(bibtex_path, ('doi', 'eprint', 'year'))
     except Exception as e:
         print(f"Error parsing BibTeX: {e}")
         return {}
 
     entries = {}
-    for key, entry in bibdata.entries.items():
-        doi = entry.fields.get('doi', '').strip()
-        eprint = entry.fields.get('eprint', '').strip()
-        year = entry.fields.get('year', '')
+    for key, fields in fields_by_key.items():
+        doi = fields.get('doi', '').strip()
+        eprint = fields.get('eprint', '').strip()
+        year = fields.get('year', '')
 
         entries[key] = {
             'doi': doi if doi else None,
@@ -127,6 +53,10 @@ def load_bibtex_entries(bibtex_path):
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    citefetch.add_arguments(parser)
+    args = parser.parse_args()
+
     # Find the project root
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
@@ -172,10 +102,8 @@ def main():
 
     # Load existing citations cache
     citations_path = project_root / 'content' / 'citations.json'
-    existing_citations = {}
-    if citations_path.exists():
-        with open(citations_path, 'r') as f:
-            existing_citations = json.load(f)
+    existing_citations = citestore.load(str(citations_path))
+    if existing_citations:
         print(f"Loaded {len(existing_citations)} existing citations from cache")
 
     # Find NEW entries (not in cache and not in manual overrides)
@@ -199,52 +127,65 @@ def main():
         citations[key] = manual_citations[key]
 
     # Fetch citations only for new publications
-    fetched = 0
-    for i, key in enumerate(new_keys):
+    to_fetch = {}
+    for key in new_keys:
         if key not in bibtex_entries:
-            print(f"  [{i+1}/{len(new_keys)}] {key}: not in BibTeX")
+            print(f"  {key}: not in BibTeX")
             continue
+        to_fetch[key] = bibtex_entries[key]
 
-        entry = bibtex_entries[key]
-        doi = entry.get('doi')
-        arxiv_id = entry.get('arxiv_id')
-
-        print(f"  [{i+1}/{len(new_keys)}] {key}...", end=" ")
-
-        result = fetch_citation_count(doi=doi, arxiv_id=arxiv_id)
-
-        if result:
-            citation_entry = {
-                'cited_by_count': result['cited_by_count'],
-                'year': entry.get('year', ''),
-            }
-            # Store the appropriate ID based on source
-            if result.get('source') == 'openalex':
-                citation_entry['openalex_id'] = result.get('openalex_id', '')
-                print(f"{result['cited_by_count']} citations (OpenAlex)")
-            elif result.get('source') == 'semantic_scholar':
-                citation_entry['semantic_scholar_id'] = result.get('semantic_scholar_id', '')
-                print(f"{result['cited_by_count']} citations (Semantic Scholar)")
+    fetched = 0
+    fetcher = citefetch.from_arguments(args)
+    fetched_at = citeschedule.now_timestamp()
+
+    # Checkpoint while fetching; an interrupted run is resumed by simply
+    # running again, as what it fetched is no longer new
+    checkpoint = citestore.Checkpointer(str(citations_path))
+    try:
+        for i, (key, result) in enumerate(fetcher.fetch_many(to_fetch)):
+            entry = to_fetch[key]
+            prefix = f"  [{i+1}/{len(to_fetch)}] {key}:"
+
+            if result:
+                citation_entry = {
+                    'cited_by_count': result['cited_by_count'],
+                    'year': entry.get('year', ''),
+                    'fetched_at': fetched_at,
+                }
+                # Store the appropriate ID based on source
+                if result.get('source') == 'openalex':
+                    citation_entry['openalex_id'] = result.get('openalex_id', '')
+                    print(f"{prefix} {result['cited_by_count']} citations (OpenAlex)")
+                elif result.get('source') == 'semantic_scholar':
+                    citation_entry['semantic_scholar_id'] = result.get('semantic_scholar_id', '')
+                    print(f"{prefix} {result['cited_by_count']} citations (Semantic Scholar)")
+                else:
+                    print(f"{prefix} {result['cited_by_count']} citations")
+                citations[key] = citation_entry
+                fetched += 1
             else:
-                print(f"{result['cited_by_count']} citations")
-            citations[key] = citation_entry
-            fetched += 1
-        else:
-            citations[key] = {
-                'cited_by_count': 0,
-                'year': entry.get('year', ''),
-            }
-            print("no data")
-
-        # Be polite to the API
-        time.sleep(0.1)
+                citations[key] = {
+                    'cited_by_count': 0,
+                    'year': entry.get('year', ''),
+                    'fetched_at': fetched_at,
+                }
+                print(f"{prefix} no data")
+            checkpoint.update(citations)
+    except KeyboardInterrupt:
+        checkpoint.save(citations)
+        print("\nInterrupted: progress saved, run again to continue")
+        sys.exit(130)
+    if fetcher.skipped:
+        print(f"Request budget spent: {len(fetcher.skipped)} publications left for the next run")
 
     # Save citations
-    with open(citations_path, 'w') as f:
-        json.dump(citations, f, indent=2, sort_keys=True)
+    changed = citestore.save(str(citations_path), citations)
 
     print(f"\nFetched {fetched} new citations")
-    print(f"Saved {len(citations)} total citations to {citations_path}")
+    if changed:
+        print(f"Saved {len(citations)} total citations to {citations_path}")
+    else:
+        print(f"{citations_path} is up to date ({len(citations)} citations)")
 
     # Print summary
     total_citations = sum(c.get('cited_by_count', 0) for c in citations.values())